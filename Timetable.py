@@ -1,123 +1,657 @@
-from datetime import datetime, timedelta
-from dateutil import parser
+from array import array
+from bisect import bisect_left, bisect_right
+from collections import namedtuple
+from contextlib import contextmanager
+from datetime import date, datetime, timedelta
+from functools import lru_cache
+import argparse
+import json
+import os
+import re
 import sqlite3
+import sys
+import threading
+import weakref
+
+from timetable_metrics import count_rows, instrument
+import timetable_metrics
+
+# Database settings used by every connection the module opens
+DB_PATH = "timetable.db"
+DB_PRAGMAS = {
+    "journal_mode": "WAL",
+    "synchronous": "NORMAL",
+    "mmap_size": 256 * 1024 * 1024,
+    "cache_size": -64 * 1024,
+    # Milliseconds a connection waits for another writer's lock before "database is locked"
+    "busy_timeout": 5000,
+}
+# Number of prepared statements sqlite3 keeps per connection
+DB_CACHED_STATEMENTS = 256
+# User the completions are recorded for when no user_id is given
+DEFAULT_USER_ID = "default"
+WEEKDAYS = ["Monday", "Tuesday", "Wednesday", "Thursday", "Friday", "Saturday", "Sunday"]
+
+_local = threading.local()
+_generation_lock = threading.Lock()
+_generation = 0
+
+# Function to change the database path or pragmas; every thread reconnects with the
+# new settings on its next call
+def configure_database(path=None, **pragmas):
+    global DB_PATH
+    close_connections()
+    if path is not None:
+        DB_PATH = path
+    DB_PRAGMAS.update(pragmas)
+
+# Holder of a thread's pooled connection; it lives in the thread-local storage, so when
+# the thread ends the holder is dropped and the finalizer closes the connection
+class _ConnectionHolder:
+    def __init__(self, conn, generation):
+        self.conn = conn
+        self.generation = generation
+        self.close = weakref.finalize(self, conn.close)
+
+# Function to return this thread's connection, opening it on first use; a connection
+# left over from before close_connections() is closed here, by the thread that owns it
+def get_connection():
+    conn = getattr(_local, "override", None)
+    if conn is not None:
+        return conn
+    holder = getattr(_local, "holder", None)
+    if holder is not None:
+        if holder.generation == _generation:
+            return holder.conn
+        holder.close()
+
+    conn = _open_connection()
+    _local.holder = _ConnectionHolder(conn, _generation)
+    return conn
+
+# Context manager making get_connection() on this thread return the given connection
+# (such as a shard connection of timetable_shards) for the duration of the block, so the
+# module's functions run against another database without touching DB_PATH
+@contextmanager
+def use_connection(conn):
+    previous = getattr(_local, "override", None), getattr(_local, "in_transaction", False)
+    _local.override = conn
+    _local.in_transaction = False
+    try:
+        yield conn
+    finally:
+        _local.override, _local.in_transaction = previous
+
+# Function to open a connection (to DB_PATH unless another path is given) with the
+# configured pragmas and SQL functions
+@instrument
+def _open_connection(path=None):
+    conn = sqlite3.connect(
+        path or DB_PATH,
+        cached_statements=DB_CACHED_STATEMENTS,
+        check_same_thread=False,
+        factory=timetable_metrics.connection_factory,
+    )
+    for name, value in DB_PRAGMAS.items():
+        conn.execute("PRAGMA {}={}".format(name, value))
+    conn.create_function("iso_week", 1, iso_week, deterministic=True)
+    return conn
+
+# Context manager that runs the block in one transaction on this thread's connection
+# Inside another transaction() block (such as a group commit of timetable_writer) it joins the
+# outer transaction, which commits or rolls back the whole block
+# immediate=True takes the write lock up front (BEGIN IMMEDIATE) instead of at the first write
+@contextmanager
+def transaction(immediate=False):
+    conn = get_connection()
+    if getattr(_local, "in_transaction", False):
+        yield conn
+        return
+    _local.in_transaction = True
+    try:
+        with conn:
+            if immediate:
+                conn.execute("BEGIN IMMEDIATE")
+            yield conn
+    finally:
+        _local.in_transaction = False
+
+# Function to retire every pooled connection (for shutdown and reconfiguration)
+# This thread's connection is closed now; other threads may be using theirs, so each
+# of them is closed by its own thread on its next call, or when that thread ends
+def close_connections():
+    global _generation
+    with _generation_lock:
+        _generation += 1
+    holder = getattr(_local, "holder", None)
+    if holder is not None:
+        holder.close()
+        _local.holder = None
 
 # Function to create the timetable table in the database
 def create_table():
-    conn = sqlite3.connect("timetable.db")
-    cursor = conn.cursor()
-
-    cursor.execute('''
-        CREATE TABLE IF NOT EXISTS timetable (
-            day TEXT,
-            time TEXT,
-            activity TEXT,
-            time_duration TEXT,
-            PRIMARY KEY (day, time)
+    with transaction() as conn:
+        conn.execute('''
+            CREATE TABLE IF NOT EXISTS timetable (
+                day TEXT,
+                time TEXT,
+                activity TEXT,
+                time_duration TEXT,
+                start_min INTEGER,
+                end_min INTEGER,
+                PRIMARY KEY (day, time)
+            )
+        ''')
+        migrate_table(conn)
+
+        # Append-only log of completed slots; the unique index keeps re-marking idempotent
+        # and, like the activity index, covers the reward and adherence queries
+        conn.execute('''
+            CREATE TABLE IF NOT EXISTS completions (
+                user_id TEXT,
+                date TEXT,
+                day TEXT,
+                start_min INTEGER,
+                end_min INTEGER,
+                activity TEXT,
+                completed_at TEXT
+            )
+        ''')
+        conn.execute(
+            "CREATE UNIQUE INDEX IF NOT EXISTS completions_user_date "
+            "ON completions (user_id, date, start_min, end_min, activity)"
+        )
+        conn.execute(
+            "CREATE INDEX IF NOT EXISTS completions_activity_date "
+            "ON completions (activity, date, user_id, start_min, end_min)"
+        )
+        # Per-user reports seek to (activity, user_id) and range over the dates, instead of
+        # scanning every user's rows of the date range
+        conn.execute(
+            "CREATE INDEX IF NOT EXISTS completions_activity_user "
+            "ON completions (activity, user_id, date, start_min, end_min)"
         )
-    ''')
 
-    conn.commit()
-    conn.close()
+        # Completed minutes per user for all time, per day and per ISO week, kept up to date
+        # by triggers in the same transaction as every completion insert or delete
+        conn.execute('''
+            CREATE TABLE IF NOT EXISTS reward_totals (
+                user_id TEXT,
+                period TEXT,
+                period_key TEXT,
+                minutes INTEGER,
+                PRIMARY KEY (user_id, period, period_key)
+            )
+        ''')
+        for event, row, sign in (("INSERT", "NEW", "+"), ("DELETE", "OLD", "-")):
+            conn.execute(
+                "CREATE TRIGGER IF NOT EXISTS completions_totals_{} AFTER {} ON completions BEGIN {} END".format(
+                    event.lower(), event,
+                    "".join(REWARD_TOTALS_UPSERT.format(row=row, sign=sign, period=period, key=key.format(row=row))
+                            for period, key in REWARD_TOTAL_PERIODS),
+                )
+            )
+        if conn.execute("SELECT NOT EXISTS (SELECT 1 FROM reward_totals) AND EXISTS (SELECT 1 FROM completions)").fetchone()[0]:
+            rebuild_reward_totals(conn)
+        migrate_completion_marks(conn)
+
+# Period key expressions for reward_totals; the ISO week is taken from the Thursday of the
+# date's week, which is always in the ISO year the week belongs to
+REWARD_TOTAL_PERIODS = (
+    ("all", "''"),
+    ("day", "{row}.date"),
+    ("week", (
+        "strftime('%Y', date({row}.date, '-3 days', 'weekday 4')) || '-W' || "
+        "printf('%02d', (strftime('%j', date({row}.date, '-3 days', 'weekday 4')) - 1) / 7 + 1)"
+    )),
+)
+REWARD_TOTALS_UPSERT = (
+    "INSERT INTO reward_totals VALUES ({row}.user_id, '{period}', {key}, "
+    "{sign}COALESCE({row}.end_min - {row}.start_min, 0)) "
+    "ON CONFLICT (user_id, period, period_key) DO UPDATE SET minutes = minutes + excluded.minutes;"
+)
+
+# Function to recompute reward_totals from the completion log, as a list of
+# (user_id, period, period_key, minutes) rows
+def compute_reward_totals(conn):
+    totals = []
+    for period, key in REWARD_TOTAL_PERIODS:
+        totals += conn.execute(
+            "SELECT user_id, '{}', {}, SUM(COALESCE(end_min - start_min, 0)) "
+            "FROM completions GROUP BY 1, 3".format(period, key.format(row="completions"))
+        ).fetchall()
+    return totals
+
+# Function to replace reward_totals with totals recomputed from the completion log
+def rebuild_reward_totals(conn):
+    conn.execute("DELETE FROM reward_totals")
+    conn.executemany("INSERT INTO reward_totals VALUES (?, ?, ?, ?)", compute_reward_totals(conn))
+
+# Function to add the start_min/end_min columns to databases created before they existed
+# and fill them in from the "Time" strings once
+def migrate_table(conn):
+    columns = {row[1] for row in conn.execute("PRAGMA table_info(timetable)")}
+    for column in ("start_min", "end_min"):
+        if column not in columns:
+            conn.execute("ALTER TABLE timetable ADD COLUMN {} INTEGER".format(column))
+
+    pending = conn.execute("SELECT DISTINCT time FROM timetable WHERE start_min IS NULL").fetchall()
+    conn.executemany(
+        "UPDATE timetable SET start_min=?, end_min=? WHERE time=?",
+        (parse_time_range(time) + (time,) for (time,) in pending),
+    )
+
+# Function to move completions marked the old way, as time_duration='completed' on the
+# timetable row, into the completions log of the default user on the latest matching date
+# The marks are cleared once logged, so running it again adds nothing
+def migrate_completion_marks(conn):
+    marked = conn.execute(
+        "SELECT day, start_min, end_min, activity FROM timetable "
+        "WHERE time_duration='completed' AND start_min IS NOT NULL"
+    ).fetchall()
+    if not marked:
+        return
+    completed_at = datetime.now().isoformat(timespec="seconds")
+    conn.executemany(
+        "INSERT OR IGNORE INTO completions VALUES (?, ?, ?, ?, ?, ?, ?)",
+        ((DEFAULT_USER_ID, latest_date_for_day(day).isoformat(), day, start_min, end_min, activity, completed_at)
+         for day, start_min, end_min, activity in marked if day in WEEKDAYS),
+    )
+    conn.execute(
+        "UPDATE timetable SET time_duration='' WHERE time_duration='completed' AND start_min IS NOT NULL AND day IN ({})".format(
+            ", ".join("?" * len(WEEKDAYS))
+        ),
+        WEEKDAYS,
+    )
 
 # Function to insert the timetable data into the database
 def insert_timetable_data(timetable):
-    conn = sqlite3.connect("timetable.db")
-    cursor = conn.cursor()
-
-    for day_data in timetable:
-        day = day_data["Day"]
-        time = day_data["Time"]
-        activity = day_data["Activity"]
-        time_duration = day_data["Time Duration"]
-
-        # Check if the record already exists in the database
-        cursor.execute("SELECT * FROM timetable WHERE day=? AND time=?", (day, time))
-        existing_record = cursor.fetchone()
-
-        if existing_record is None:
-            cursor.execute("INSERT INTO timetable VALUES (?, ?, ?, ?)", (day, time, activity, time_duration))
-        else:
-            # You can choose to update the existing record here if needed
-            # For example: cursor.execute("UPDATE timetable SET activity=?, time_duration=? WHERE day=? AND time=?", (activity, time_duration, day, time))
-            pass
-
-    conn.commit()
-    conn.close()
+    return bulk_insert_timetable_data(timetable, on_conflict="ignore")
+
+# SQL used by the bulk insert for each conflict policy on (day, time)
+INSERT_SQL = (
+    "INSERT INTO timetable (day, time, activity, time_duration, start_min, end_min) "
+    "VALUES (?, ?, ?, ?, ?, ?) ON CONFLICT(day, time) "
+)
+UPSERT_SQL = {
+    "ignore": INSERT_SQL + "DO NOTHING",
+    "update": (
+        INSERT_SQL + "DO UPDATE SET "
+        "activity=excluded.activity, time_duration=excluded.time_duration "
+        "WHERE activity IS NOT excluded.activity OR time_duration IS NOT excluded.time_duration"
+    ),
+}
+
+# Function to insert any iterable of slots in one transaction with executemany
+# Returns a dict with the number of rows inserted, updated and skipped
+# With validate=True the slots are checked first and ValueError is raised on blocking issues
+@instrument
+def bulk_insert_timetable_data(slots, on_conflict="ignore", validate=False):
+    if on_conflict not in UPSERT_SQL:
+        raise ValueError("on_conflict must be one of: {}".format(", ".join(UPSERT_SQL)))
+    if validate:
+        slots = list(slots)
+        blocking = [issue for issue in validate_timetable(slots) if issue.kind in BLOCKING_ISSUES]
+        if blocking:
+            raise ValueError("{} invalid slots, first: {}".format(len(blocking), blocking[0]))
+
+    seen = 0
+
+    def rows():
+        nonlocal seen
+        for day_data in slots:
+            seen += 1
+            start_min, end_min = slot_minutes(day_data)
+            yield (day_data["Day"], day_data["Time"], day_data["Activity"], day_data["Time Duration"], start_min, end_min)
+
+    with transaction() as conn:
+        # New rows get rowids above the current maximum and upserts keep theirs, so the
+        # inserted rows can be counted with a rowid range scan instead of a full COUNT(*)
+        max_rowid = conn.execute("SELECT COALESCE(MAX(rowid), 0) FROM timetable").fetchone()[0]
+        changes_before = conn.total_changes
+        conn.executemany(UPSERT_SQL[on_conflict], rows())
+        changed = conn.total_changes - changes_before
+        inserted = conn.execute("SELECT COUNT(*) FROM timetable WHERE rowid > ?", (max_rowid,)).fetchone()[0]
+
+    updated = changed - inserted
+    count_rows("bulk_insert_timetable_data", seen)
+    return {"inserted": inserted, "updated": updated, "skipped": seen - inserted - updated}
+
+# Grammar of the time strings used in the timetable: "8am", "10:30pm", "11 PM", "19:30"
+TIME_PATTERN = re.compile(r"\s*(\d{1,2})(?::(\d{2}))?\s*(?:([ap])\.?m\.?)?\s*", re.IGNORECASE)
+# Separator between the two ends of a range: "7pm - 8pm", "7pm-8pm", "7pm -8pm"
+RANGE_SEPARATOR = re.compile(r"\s*-\s*")
 
 # Function to parse time strings with and without minutes
+@instrument
 def parse_time_string(time_str):
+    minutes = parse_time_minutes(time_str)
+    if minutes is None:
+        return None
+    return format_time_minutes(minutes)
+
+# Function to format minutes since midnight as "07:30PM" (minutes past midnight wrap around)
+def format_time_minutes(minutes):
+    hour, minute = divmod(minutes % (24 * 60), 60)
+    return "{:02d}:{:02d}{}".format((hour - 1) % 12 + 1, minute, "AM" if hour < 12 else "PM")
+
+# Function to convert a time string such as "8:30pm" into minutes since midnight
+@lru_cache(maxsize=4096)
+def parse_time_minutes(time_str):
+    match = TIME_PATTERN.fullmatch(time_str)
+    if match is None:
+        return _parse_time_minutes_fallback(time_str)
+
+    hour = int(match.group(1))
+    minute = int(match.group(2) or 0)
+    meridiem = match.group(3)
+
+    # Anything outside the timetable grammar ("7", "13pm", "9:75pm") goes to dateutil
+    if meridiem is None:
+        if match.group(2) is None or hour > 23 or minute > 59:
+            return _parse_time_minutes_fallback(time_str)
+    elif not 1 <= hour <= 12 or minute > 59:
+        return _parse_time_minutes_fallback(time_str)
+    else:
+        hour = hour % 12 + (12 if meridiem in "pP" else 0)
+    return hour * 60 + minute
+
+# Function to parse unusual time strings with dateutil's generic parser
+@instrument
+def _parse_time_minutes_fallback(time_str):
+    from dateutil import parser
+
     try:
         time_obj = parser.parse(time_str)
-        return time_obj.strftime("%I:%M%p")
-    except ValueError:
+    except (ValueError, OverflowError):
         return None
+    return time_obj.hour * 60 + time_obj.minute
+
+# Function to convert a "Time" value such as "7pm - 8:30pm" into (start_min, end_min)
+# Open-ended slots such as "11pm" have no end; a range past midnight ends on the next day
+# A range whose end does not parse ("9am - banana") is unparseable as a whole, (None, None),
+# so it is never mistaken for an open-ended slot
+@lru_cache(maxsize=4096)
+def parse_time_range(time_str):
+    parts = RANGE_SEPARATOR.split(time_str.strip(), maxsplit=1)
+    start_min = parse_time_minutes(parts[0])
+    if len(parts) == 1 or start_min is None:
+        return start_min, None
+
+    end_min = parse_time_minutes(parts[1])
+    if end_min is None:
+        return None, None
+    if end_min < start_min:
+        end_min += 24 * 60
+    return start_min, end_min
+
+# Function to get (start_min, end_min) for a slot, only parsing "Time" when the
+# slot did not come from the database with the columns already filled in
+def slot_minutes(slot):
+    if slot.get("Start Min") is not None:
+        return slot["Start Min"], slot.get("End Min")
+    return parse_time_range(slot["Time"])
+
+# Problem found by validate_timetable; "other" is the slot an overlap collides with
+TimetableIssue = namedtuple("TimetableIssue", ["kind", "day", "time", "other", "start_min", "end_min"])
+# Issue kinds that make bulk_insert_timetable_data(validate=True) refuse the rows;
+# gaps and open-ended slots (like "11pm" for sleep) are reported but allowed
+BLOCKING_ISSUES = ("unparseable", "zero-length", "overlap")
+
+# Function to check slots for unparseable, zero-length and open-ended times, and run a
+# sweep line over each day's intervals (sorted by start, open-ended ones running to
+# midnight) to find overlaps and gaps
+# Runs in O(n log n) and returns the issues as a list of TimetableIssue
+@instrument
+def validate_timetable(timetable_data):
+    issues = []
+    days = {}
+    for slot in timetable_data:
+        start_min, end_min = slot_minutes(slot)
+        if start_min is None:
+            issues.append(TimetableIssue("unparseable", slot["Day"], slot["Time"], None, None, None))
+        elif end_min == start_min:
+            issues.append(TimetableIssue("zero-length", slot["Day"], slot["Time"], None, start_min, end_min))
+        else:
+            if end_min is None:
+                issues.append(TimetableIssue("open-ended", slot["Day"], slot["Time"], None, start_min, None))
+                # Swept as running until midnight, as TimetableIndex treats it
+                end_min = 24 * 60
+            days.setdefault(slot["Day"], []).append((start_min, end_min, slot["Time"]))
+
+    for day, intervals in days.items():
+        intervals.sort()
+        # Sweep state: the interval reaching furthest so far and where it ends
+        reach_end, reach_time = intervals[0][1], intervals[0][2]
+        for start_min, end_min, time in intervals[1:]:
+            if start_min < reach_end:
+                issues.append(TimetableIssue("overlap", day, time, reach_time, start_min, min(end_min, reach_end)))
+            elif start_min > reach_end:
+                issues.append(TimetableIssue("gap", day, time, reach_time, reach_end, start_min))
+            if end_min > reach_end:
+                reach_end, reach_time = end_min, time
+        count_rows("validate_timetable", len(intervals))
+    return issues
+
+# Function to audit the slots already stored in the database
+def audit_timetable():
+    return validate_timetable(convert_to_dict(get_connection().execute("SELECT * FROM timetable")))
+
+# Function to get the ISO week ("2024-W07") of an ISO date string
+def iso_week(date_str):
+    year, week, _ = date.fromisoformat(date_str).isocalendar()
+    return "{}-W{:02d}".format(year, week)
+
+# Function to get the most recent date (today or earlier) that falls on the given weekday
+def latest_date_for_day(day, today=None):
+    today = today or date.today()
+    days_back = (today.weekday() - WEEKDAYS.index(day)) % 7
+    return today - timedelta(days=days_back)
 
 # Function to mark the GATE study completion for a specific day and time
-def mark_gate_study_completion(day, time):
-    conn = sqlite3.connect("timetable.db")
-    cursor = conn.cursor()
-
-    # Update the "Time Duration" column to mark the completion of GATE study
-    cursor.execute("UPDATE timetable SET time_duration='completed' WHERE day=? AND time=?", (day, time))
+# The slot is appended to the completions log for the given (or latest matching) date;
+# marking it again is a no-op, and LookupError is raised when the timetable has no such slot
+@instrument
+def mark_gate_study_completion(day, time, user_id=DEFAULT_USER_ID, completed_date=None):
+    completed_date = completed_date or latest_date_for_day(day)
+    with transaction() as conn:
+        cursor = conn.execute(
+            "INSERT OR IGNORE INTO completions "
+            "SELECT ?, ?, day, start_min, end_min, activity, ? FROM timetable WHERE day=? AND time=?",
+            (user_id, completed_date.isoformat(), datetime.now().isoformat(timespec="seconds"), day, time),
+        )
+        if cursor.rowcount == 0 and conn.execute(
+            "SELECT 1 FROM timetable WHERE day=? AND time=?", (day, time)
+        ).fetchone() is None:
+            raise LookupError("no timetable slot {} {}".format(day, time))
+
+# Function to build the WHERE clause selecting completions by user, activity and date range
+def completion_filters(start_date=None, end_date=None, user_id=None, activity=None):
+    clauses = ["start_min IS NOT NULL"]
+    params = []
+    for clause, value in (("user_id=?", user_id), ("activity=?", activity),
+                          ("date>=?", start_date), ("date<=?", end_date)):
+        if value is not None:
+            clauses.append(clause)
+            params.append(str(value))
+    return " WHERE " + " AND ".join(clauses), params
+
+# Function to get the completions between two dates (inclusive, ISO strings or dates)
+def get_completions(start_date=None, end_date=None, user_id=None, activity=None):
+    where, params = completion_filters(start_date, end_date, user_id, activity)
+    query = "SELECT user_id, date, day, start_min, end_min, activity, completed_at FROM completions" + where
+    return get_connection().execute(query, params).fetchall()
+
+# Function to remove a completion again (the reward totals are reduced by the trigger)
+@instrument
+def unmark_gate_study_completion(day, time, user_id=DEFAULT_USER_ID, completed_date=None):
+    completed_date = completed_date or latest_date_for_day(day)
+    with transaction() as conn:
+        conn.execute(
+            "DELETE FROM completions WHERE rowid IN (SELECT c.rowid FROM completions c JOIN timetable t "
+            "ON c.start_min=t.start_min AND c.end_min IS t.end_min AND c.activity=t.activity "
+            "WHERE c.user_id=? AND c.date=? AND t.day=? AND t.time=?)",
+            (user_id, completed_date.isoformat(), day, time),
+        )
 
-    conn.commit()
-    conn.close()
+# Function to read the maintained reward total of a user for all time ("all"), a day
+# ("day", "2024-02-12") or an ISO week ("week", "2024-W07") with one primary-key lookup
+@instrument
+def get_reward_to_transfer(user_id=DEFAULT_USER_ID, period="all", period_key="", reward_per_hour=10):
+    row = get_connection().execute(
+        "SELECT minutes FROM reward_totals WHERE user_id=? AND period=? AND period_key=?",
+        (user_id, period, str(period_key)),
+    ).fetchone()
+    return (row[0] if row else 0) / 60 * reward_per_hour
+
+# Function to compare reward_totals with a full recomputation and return the drifted rows
+# as (user_id, period, period_key, stored minutes, recomputed minutes); fix=True rebuilds them
+@instrument
+def verify_reward_totals(fix=False):
+    with transaction() as conn:
+        expected = {row[:3]: row[3] for row in compute_reward_totals(conn)}
+        stored = {row[:3]: row[3] for row in conn.execute("SELECT * FROM reward_totals")}
+        drift = [
+            key + (stored.get(key, 0), expected.get(key, 0))
+            for key in sorted(expected.keys() | stored.keys())
+            if stored.get(key, 0) != expected.get(key, 0)
+        ]
+        if drift and fix:
+            rebuild_reward_totals(conn)
+    return drift
+
+# Function to calculate the reward for the completions between two dates
+@instrument
+def calculate_reward_for_range(start_date=None, end_date=None, user_id=None, reward_per_hour=10):
+    where, params = completion_filters(start_date, end_date, user_id)
+    minutes = get_connection().execute(
+        "SELECT SUM(end_min - start_min) FROM completions" + where + " AND end_min IS NOT NULL", params
+    ).fetchone()[0]
+    return (minutes or 0) / 60 * reward_per_hour
+
+# Sorted per-day index of the slots, built once from the rows, for bisect-based
+# lookups of the active slot, the next slot and the slots overlapping a range
+class TimetableIndex:
+    def __init__(self, timetable_data):
+        days = {}
+        for slot in timetable_data:
+            start_min, end_min = slot_minutes(slot)
+            if start_min is None:
+                continue
+            # Open-ended slots such as "11pm" run until midnight
+            if end_min is None:
+                end_min = 24 * 60
+            days.setdefault(slot["Day"], []).append((start_min, end_min, slot))
+
+        self.starts = {}
+        self.ends = {}
+        self.slots = {}
+        self.longest = {}
+        for day, entries in days.items():
+            entries.sort(key=lambda entry: (entry[0], entry[1]))
+            self.starts[day] = [entry[0] for entry in entries]
+            self.ends[day] = [entry[1] for entry in entries]
+            self.slots[day] = [entry[2] for entry in entries]
+            self.longest[day] = max(end - start for start, end, _ in entries)
+        count_rows("TimetableIndex", sum(len(entries) for entries in days.values()))
+
+    # Slots of the day overlapping [start_min, end_min), in start order
+    def overlapping(self, day, start_min, end_min):
+        starts = self.starts.get(day)
+        if not starts:
+            return []
+
+        # A slot can only overlap if it starts less than the longest slot before start_min
+        low = bisect_right(starts, start_min - self.longest[day])
+        high = bisect_left(starts, end_min)
+        ends = self.ends[day]
+        slots = self.slots[day]
+        return [slots[i] for i in range(low, high) if ends[i] > start_min]
+
+    # Slots of the day that contain the given minute
+    def active(self, day, minute):
+        return self.overlapping(day, minute, minute + 1)
+
+    # First slot of the day starting after the given minute, or None
+    def next_slot(self, day, minute):
+        starts = self.starts.get(day, [])
+        i = bisect_right(starts, minute)
+        return self.slots[day][i] if i < len(starts) else None
+
+# Function to return a value that changes whenever this or another connection changes
+# the database, for caches built from database contents (the value is per thread)
+def database_version():
+    conn = get_connection()
+    return (_generation, id(conn), conn.execute("PRAGMA data_version").fetchone()[0], conn.total_changes)
+
+# Function to return a TimetableIndex over the database rows, rebuilt only when
+# the database has changed since this thread's last call
+@instrument
+def get_timetable_index():
+    key = database_version()
+    if getattr(_local, "index_key", None) != key:
+        _local.index = TimetableIndex(convert_to_dict(get_connection().execute("SELECT * FROM timetable")))
+        _local.index_key = key
+    return _local.index
 
 # Function to check if you studied for GATE as per the timetable
-def check_gate_study_completion(timetable_data):
-    today = datetime.now().strftime("%A")  # Get the current day (e.g., "Monday")
-    current_time = datetime.now().strftime("%I:%M%p")  # Get the current time in the format "8:30am"
-
-    for day in timetable_data:
-        if day["Day"] == today and "GATE study" in day["Activity"]:
-            start_time_str, end_time_str = day["Time"].split(" - ")
+@instrument
+def check_gate_study_completion(timetable_data, now=None):
+    if not isinstance(timetable_data, TimetableIndex):
+        timetable_data = TimetableIndex(timetable_data)
 
-            # Parse the time strings in the consistent format
-            start_time = parser.parse(start_time_str)
-            end_time = parser.parse(end_time_str)
-            current_time_obj = parser.parse(current_time)
+    now = now or datetime.now()
+    today = now.strftime("%A")  # Get the current day (e.g., "Monday")
 
-            # Check if the current time falls within the GATE study time range
-            if start_time <= current_time_obj <= end_time:
-                # Mark GATE study completion for the current day and time
-                mark_gate_study_completion(today, day["Time"])
-                return True
+    # Check if the current time falls within a GATE study time range
+    for slot in timetable_data.active(today, now.hour * 60 + now.minute):
+        if "GATE study" in slot["Activity"]:
+            # Mark GATE study completion for the current day and time
+            mark_gate_study_completion(today, slot["Time"], completed_date=now.date())
+            return True
 
     return False
 
-# Function to calculate the total reward to be transferred
+# Function to calculate the total reward to be transferred from slots carrying the legacy
+# "completed" status; stored completions live in the log, see get_reward_to_transfer
+@instrument
 def calculate_reward_to_transfer(timetable_data, reward_per_hour=10):
-    completed_gate_study_hours = 0
+    if isinstance(timetable_data, SlotTable):
+        return timetable_data.minutes_with_status("completed") / 60 * reward_per_hour
+
+    completed_gate_study_minutes = 0
 
     for day in timetable_data:
         if day["Time Duration"] == "completed":
-            start_time_str, end_time_str = day["Time"].split(" - ")
+            start_min, end_min = slot_minutes(day)
 
-            # Parse the time strings in the consistent format
-            start_time = parser.parse(start_time_str)
-            end_time = parser.parse(end_time_str)
+            # Open-ended slots (e.g. "11pm") have no duration to reward
+            if end_min is not None:
+                completed_gate_study_minutes += end_min - start_min
 
-            # Calculate the study hours using timedelta
-            study_duration = end_time - start_time
-            study_hours = study_duration.total_seconds() / 3600
-
-            completed_gate_study_hours += study_hours
-
-    total_reward = completed_gate_study_hours * reward_per_hour
+    total_reward = completed_gate_study_minutes / 60 * reward_per_hour
     return total_reward
+
 # Function to ask whether the GATE study was completed as per the timetable
-def ask_gate_study_completion():
-    current_time = datetime.now().strftime("%I:%M%p")
-    day = datetime.now().strftime("%A")
+def ask_gate_study_completion(timetable_index=None):
+    now = datetime.now()
+    current_time = now.strftime("%I:%M%p")
+    day = now.strftime("%A")
     completed_gate_study = False
 
-    # Get the GATE study activity for the current hour
-    current_hour_activity = next((activity for activity in timetable if activity["Day"] == day and activity["Time"] == current_time), None)
-
-    if current_hour_activity and "GATE study" in current_hour_activity["Activity"]:
+    # Get the GATE study activity for the current time
+    timetable_index = timetable_index or _sample_timetable_index()
+    current_hour_activity = next(
+        (slot for slot in timetable_index.active(day, now.hour * 60 + now.minute) if "GATE study" in slot["Activity"]),
+        None,
+    )
+
+    if current_hour_activity:
+        # Open-ended slots run until midnight, as in the index
+        end_min = slot_minutes(current_hour_activity)[1]
+        end_time = format_time_minutes(24 * 60 if end_min is None else end_min)
         while True:
-            user_input = input(f"Did you complete the GATE study for {day} from {current_time} to {current_hour_activity['Time'].split(' - ')[1]}? (yes/no): ")
+            user_input = input(f"Did you complete the GATE study for {day} from {current_time} to {end_time}? (yes/no): ")
             if user_input.lower() == "yes":
                 completed_gate_study = True
                 break
@@ -129,639 +663,307 @@ def ask_gate_study_completion():
 
     return completed_gate_study
 
-# Function to convert database query result into a list of dictionaries
+# Function to build the index of the example timetable once
+@lru_cache(maxsize=None)
+def _sample_timetable_index():
+    return TimetableIndex(load_sample_timetable())
+
+# Keys of the old slot dicts and the Slot fields they map to
+SLOT_FIELDS = {
+    "Day": "day",
+    "Time": "time",
+    "Activity": "activity",
+    "Time Duration": "time_duration",
+    "Start Min": "start_min",
+    "End Min": "end_min",
+}
+
+# One timetable row as a tuple (about a quarter of the size of a dict); slot["Day"] and
+# slot.get("Start Min") still work, so code written for the slot dicts accepts it unchanged
+class Slot(namedtuple("Slot", list(SLOT_FIELDS.values()))):
+    __slots__ = ()
+
+    def __getitem__(self, key):
+        if isinstance(key, str):
+            return getattr(self, SLOT_FIELDS[key])
+        return tuple.__getitem__(self, key)
+
+    def get(self, key, default=None):
+        field = SLOT_FIELDS.get(key)
+        return default if field is None else getattr(self, field)
+
+    # Function to turn the slot back into a dict with the old keys (e.g. for JSON)
+    def as_dict(self):
+        return {key: getattr(self, field) for key, field in SLOT_FIELDS.items()}
+
+    # Function to build a slot from a dict with the old keys; missing minutes stay None
+    @classmethod
+    def from_dict(cls, slot):
+        return cls(slot["Day"], slot["Time"], slot["Activity"], slot.get("Time Duration", ""),
+                   slot.get("Start Min"), slot.get("End Min"))
+
+# Columnar table of slots: the strings are interned into per-column value lists and each
+# row keeps only their ids and its minutes in arrays (about 20 bytes per slot)
+# Iterating or indexing yields Slot records, so every function taking slots accepts it
+class SlotTable:
+    STRING_COLUMNS = ("day", "time", "activity", "time_duration")
+
+    def __init__(self, slots=()):
+        self.values = {column: [] for column in self.STRING_COLUMNS}
+        self.ids = {column: array("I") for column in self.STRING_COLUMNS}
+        # Minutes since midnight; -1 stands for None (unparseable or open-ended)
+        self.start_min = array("h")
+        self.end_min = array("h")
+        self._codes = {column: {} for column in self.STRING_COLUMNS}
+        self.extend(slots)
+
+    # Function to build a table from (day, time, activity, time_duration, start_min, end_min) rows
+    @classmethod
+    def from_rows(cls, rows):
+        return cls(map(Slot._make, rows))
+
+    def append(self, slot):
+        self.extend((slot,))
+
+    def extend(self, slots):
+        columns = [(self._codes[column], self.values[column], self.ids[column].append)
+                   for column in self.STRING_COLUMNS]
+        for slot in slots:
+            if not isinstance(slot, Slot):
+                slot = Slot.from_dict(slot)
+            for (codes, values, append_id), value in zip(columns, slot):
+                code = codes.get(value)
+                if code is None:
+                    code = codes[value] = len(values)
+                    values.append(value)
+                append_id(code)
+
+            start_min, end_min = slot_minutes(slot)
+            self.start_min.append(-1 if start_min is None else start_min)
+            self.end_min.append(-1 if end_min is None else end_min)
+
+    def __len__(self):
+        return len(self.start_min)
+
+    def __getitem__(self, i):
+        start_min, end_min = self.start_min[i], self.end_min[i]
+        return Slot(*(self.values[column][self.ids[column][i]] for column in self.STRING_COLUMNS),
+                    None if start_min < 0 else start_min, None if end_min < 0 else end_min)
+
+    def __iter__(self):
+        columns = [self.ids[column] for column in self.STRING_COLUMNS]
+        values = [self.values[column] for column in self.STRING_COLUMNS]
+        for day, time, activity, status, start_min, end_min in zip(*columns, self.start_min, self.end_min):
+            yield Slot(values[0][day], values[1][time], values[2][activity], values[3][status],
+                       None if start_min < 0 else start_min, None if end_min < 0 else end_min)
+
+    # Function to sum the minutes of the slots with the given status straight from the arrays
+    def minutes_with_status(self, status):
+        code = self._codes["time_duration"].get(status)
+        return sum(
+            end_min - start_min
+            for status_id, start_min, end_min in zip(self.ids["time_duration"], self.start_min, self.end_min)
+            if status_id == code and start_min >= 0 and end_min >= 0
+        )
+
+# Function to convert database query result into a list of Slot records
+# Repeated strings (days, times, activities) are shared between the slots
+@instrument
 def convert_to_dict(data):
-    keys = ["Day", "Time", "Activity", "Time Duration"]
-    timetable_list = []
+    strings = {}
+    intern = strings.setdefault
+    timetable_list = [
+        Slot(intern(day, day), intern(time, time), intern(activity, activity), intern(status, status), start_min, end_min)
+        for day, time, activity, status, start_min, end_min in data
+    ]
+    count_rows("convert_to_dict", len(timetable_list))
+    return timetable_list
 
-    for row in data:
-        timetable_dict = dict(zip(keys, row))
-        timetable_list.append(timetable_dict)
+# Path of the example timetable data, loaded on first use
+SAMPLE_TIMETABLE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "timetable_sample.json")
+
+# Function to load the example timetable data once, as a SlotTable
+@lru_cache(maxsize=None)
+def load_sample_timetable():
+    with open(SAMPLE_TIMETABLE_PATH, encoding="utf-8") as f:
+        return SlotTable(json.load(f))
+
+# Example timetable data, kept as a lazy module attribute ("Timetable.timetable")
+def __getattr__(name):
+    if name == "timetable":
+        return load_sample_timetable()
+    raise AttributeError("module {!r} has no attribute {!r}".format(__name__, name))
+
+# Command: create the tables and, unless asked not to, load the example timetable
+def command_init(args):
+    create_table()
+    if not args.empty:
+        counts = insert_timetable_data(load_sample_timetable())
+        print("Loaded example timetable: {inserted} inserted, {skipped} already present".format(**counts))
+
+# Command: stream a CSV or JSONL timetable file into the database
+def command_import(args):
+    import timetable_io
+
+    def progress(rows, rows_per_sec):
+        print("\r{:,} rows ({:,.0f} rows/s)".format(rows, rows_per_sec), end="", file=sys.stderr, flush=True)
+
+    counts = timetable_io.import_timetable(
+        args.path,
+        file_format=args.format,
+        on_conflict="update" if args.update else "ignore",
+        batch_size=args.batch_size,
+        skip_invalid=args.skip_invalid,
+        progress=progress,
+        validate=args.validate,
+    )
+    print(file=sys.stderr)
+    print("{inserted} inserted, {updated} updated, {skipped} skipped".format(**counts))
+
+# Command: apply completion events from a file or stdin
+def command_ingest(args):
+    import timetable_io
+
+    summary = timetable_io.ingest_completions(args.path, args.format, args.batch_size, args.activity)
+    for line_number, reason in summary["errors"]:
+        print("line {}: {}".format(line_number, reason), file=sys.stderr)
+    print("{accepted} accepted, {rejected} rejected, {duplicate} duplicate".format(**summary))
+
+# Command: print the reward for the completions in a date range, read from the database
+# or, with --snapshot, from a snapshot file without touching the database
+def command_report(args):
+    if args.snapshot:
+        import timetable_snapshot
+
+        source = timetable_snapshot.Snapshot(args.snapshot)
+    else:
+        create_table()
+        source = sys.modules[__name__]
+    if args.start or args.end:
+        reward = source.calculate_reward_for_range(args.start, args.end, args.user, args.reward_per_hour)
+    else:
+        reward = source.get_reward_to_transfer(args.user or DEFAULT_USER_ID, reward_per_hour=args.reward_per_hour)
+    print("Total reward: {} rupees".format(reward))
+
+# Command: write the timetable and completion log to a memory-mappable snapshot file
+def command_snapshot(args):
+    import timetable_snapshot
+
+    create_table()
+    counts = timetable_snapshot.write_snapshot(args.path)
+    print("{slots} slots, {users} users and {completions} completions written to {path}".format(path=args.path, **counts))
+
+# Command: ask whether the current GATE study slot was completed (the original script flow)
+def command_check(args):
+    create_table()
+    reward = get_reward_to_transfer(reward_per_hour=args.reward_per_hour)
+    print("Total reward: {} rupees".format(reward))
+
+    completed_gate_study = ask_gate_study_completion(get_timetable_index())
+
+    if completed_gate_study:
+        print("Great! You completed the GATE study as per the timetable for today.")
+    else:
+        print("Oops! Looks like you missed your GATE study as per the timetable for today.")
+
+    print("Total reward to be transferred: {} rupees".format(reward if completed_gate_study else 0))
+
+# Command: recompute the reward totals from the completion log and report any drift
+def command_verify(args):
+    create_table()
+    drift = verify_reward_totals(fix=args.fix)
+    for user_id, period, period_key, stored, expected in drift:
+        print("{} {} {}: stored {} min, recomputed {} min".format(user_id, period, period_key or "-", stored, expected))
+    print("{} drifted totals{}".format(len(drift), " (rebuilt)" if drift and args.fix else ""))
+    if drift and not args.fix:
+        sys.exit(1)
+
+# Command: report overlaps, gaps and open-ended or invalid slots in the database
+def command_audit(args):
+    create_table()
+    issues = audit_timetable()
+    for issue in issues:
+        if args.all or issue.kind in BLOCKING_ISSUES:
+            detail = " (with {})".format(issue.other) if issue.kind == "overlap" else ""
+            if issue.kind == "gap":
+                detail = " ({} free minutes after {})".format(issue.end_min - issue.start_min, issue.other)
+            print("{}: {} {}{}".format(issue.kind, issue.day, issue.time, detail))
+
+    counts = {}
+    for issue in issues:
+        counts[issue.kind] = counts.get(issue.kind, 0) + 1
+    print(", ".join("{} {}".format(count, kind) for kind, count in sorted(counts.items())) or "no issues")
+    if any(kind in BLOCKING_ISSUES for kind in counts):
+        sys.exit(1)
+
+# Function to build the command line parser
+def build_arg_parser():
+    arg_parser = argparse.ArgumentParser(prog="Timetable", description="GATE study timetable and rewards")
+    arg_parser.add_argument("--db", default=DB_PATH, help="SQLite database path (default: %(default)s)")
+    subparsers = arg_parser.add_subparsers(dest="command")
+
+    init_parser = subparsers.add_parser("init", help="create the tables and load the example timetable")
+    init_parser.add_argument("--empty", action="store_true", help="only create the tables")
+    init_parser.set_defaults(func=command_init)
+
+    import_parser = subparsers.add_parser("import", help="import a CSV or JSONL timetable")
+    import_parser.add_argument("path")
+    import_parser.add_argument("--format", choices=["csv", "jsonl"], help="default: from the file extension")
+    import_parser.add_argument("--update", action="store_true", help="update existing (day, time) slots")
+    import_parser.add_argument("--batch-size", type=int, default=10000)
+    import_parser.add_argument("--skip-invalid", action="store_true", help="skip rows that fail validation")
+    import_parser.add_argument("--validate", action="store_true", help="refuse batches with overlapping slots")
+    import_parser.set_defaults(func=command_import)
+
+    ingest_parser = subparsers.add_parser("ingest", help="apply completion events from a CSV/JSONL file or stdin")
+    ingest_parser.add_argument("path", help="events file, or - for JSONL on stdin")
+    ingest_parser.add_argument("--format", choices=["csv", "jsonl"], help="default: from the file extension")
+    ingest_parser.add_argument("--batch-size", type=int, default=1000)
+    ingest_parser.add_argument("--activity", default="GATE study", help="activity of events given by 'at'")
+    ingest_parser.set_defaults(func=command_ingest)
+
+    report_parser = subparsers.add_parser("report", help="print the reward for a date range")
+    report_parser.add_argument("--from", dest="start", help="first date (YYYY-MM-DD)")
+    report_parser.add_argument("--to", dest="end", help="last date (YYYY-MM-DD)")
+    report_parser.add_argument("--user", help="only this user id (default user without dates)")
+    report_parser.add_argument("--reward-per-hour", type=float, default=10)
+    report_parser.add_argument("--snapshot", help="read a snapshot file instead of the database")
+    report_parser.set_defaults(func=command_report)
+
+    snapshot_parser = subparsers.add_parser("snapshot", help="write a snapshot file for fast read-only reports")
+    snapshot_parser.add_argument("path")
+    snapshot_parser.set_defaults(func=command_snapshot)
+
+    check_parser = subparsers.add_parser("check", help="ask whether the current GATE study slot was done")
+    check_parser.add_argument("--reward-per-hour", type=float, default=10)
+    check_parser.set_defaults(func=command_check)
+
+    verify_parser = subparsers.add_parser("verify", help="check the reward totals against the completion log")
+    verify_parser.add_argument("--fix", action="store_true", help="rebuild drifted totals")
+    verify_parser.set_defaults(func=command_verify)
+
+    audit_parser = subparsers.add_parser("audit", help="find overlapping, zero-length and open-ended slots")
+    audit_parser.add_argument("--all", action="store_true", help="also list gaps and open-ended slots")
+    audit_parser.set_defaults(func=command_audit)
+
+    return arg_parser
+
+# Entry point for "python Timetable.py <command>"; without a command it runs init and check
+# like the original script did
+def main(argv=None):
+    args = build_arg_parser().parse_args(argv)
+    configure_database(args.db)
+    try:
+        if args.command is None:
+            command_init(argparse.Namespace(empty=False))
+            command_check(argparse.Namespace(reward_per_hour=10))
+        else:
+            args.func(args)
+    finally:
+        close_connections()
 
-    return timetable_list
 
-# Example timetable data
-timetable = [
-    # Monday
-    {
-        "Day": "Monday",
-        "Time": "7am - 8am",
-        "Activity": "Morning Routine",
-        "Time Duration": "",
-    },
-    {
-        "Day": "Monday",
-        "Time": "8am - 9am",
-        "Activity": "Travel",
-        "Time Duration": "",
-    },
-    {
-        "Day": "Monday",
-        "Time": "9am - 12pm",
-        "Activity": "College lectures",
-        "Time Duration": "",
-    },
-    {
-        "Day": "Monday",
-        "Time": "12pm - 1pm",
-        "Activity": "Lunch Break",
-        "Time Duration": "",
-    },
-    {
-        "Day": "Monday",
-        "Time": "1pm - 4pm",
-        "Activity": "College lectures",
-        "Time Duration": "",
-    },
-    {
-        "Day": "Monday",
-        "Time": "4pm - 5pm",
-        "Activity": "Evening Routine",
-        "Time Duration": "",
-    },
-    {
-        "Day": "Monday",
-        "Time": "5pm - 6pm",
-        "Activity": "GATE study",
-        "Time Duration": "",
-    },
-    {
-        "Day": "Monday",
-        "Time": "6pm - 7pm",
-        "Activity": "Break/Snacks",
-        "Time Duration": "",
-    },
-    {
-        "Day": "Monday",
-        "Time": "7pm - 8:30pm",
-        "Activity": "GATE study",
-        "Time Duration": "",
-    },
-    {
-        "Day": "Monday",
-        "Time": "8:30pm - 9pm",
-        "Activity": "Dinner",
-        "Time Duration": "",
-    },
-    {
-        "Day": "Monday",
-        "Time": "9pm - 10:30pm",
-        "Activity": "GATE study",
-        "Time Duration": "",
-    },
-    {
-        "Day": "Monday",
-        "Time": "10:30pm - 11pm",
-        "Activity": "Revision of day's topics",
-        "Time Duration": "",
-    },
-    {
-        "Day": "Monday",
-        "Time": "11pm",
-        "Activity": "Sleep",
-        "Time Duration": "",
-    },
-
-    # Tuesday
-    {
-        "Day": "Tuesday",
-        "Time": "7am - 8am",
-        "Activity": "Morning Routine",
-        "Time Duration": "",
-    },
-    {
-        "Day": "Tuesday",
-        "Time": "8am - 9am",
-        "Activity": "Travel",
-        "Time Duration": "",
-    },
-    {
-        "Day": "Tuesday",
-        "Time": "9am - 12pm",
-        "Activity": "College lectures",
-        "Time Duration": "",
-    },
-    {
-        "Day": "Tuesday",
-        "Time": "12pm - 1pm",
-        "Activity": "Lunch Break",
-        "Time Duration": "",
-    },
-    {
-        "Day": "Tuesday",
-        "Time": "1pm - 4pm",
-        "Activity": "College lectures",
-        "Time Duration": "",
-    },
-    {
-        "Day": "Tuesday",
-        "Time": "4pm - 5pm",
-        "Activity": "Evening Routine",
-        "Time Duration": "",
-    },
-    {
-        "Day": "Tuesday",
-        "Time": "5pm - 6pm",
-        "Activity": "GATE study",
-        "Time Duration": "",
-    },
-    {
-        "Day": "Tuesday",
-        "Time": "6pm - 7pm",
-        "Activity": "Break/Snacks",
-        "Time Duration": "",
-    },
-    {
-        "Day": "Tuesday",
-        "Time": "7pm - 8:30pm",
-        "Activity": "GATE study",
-        "Time Duration": "",
-    },
-    {
-        "Day": "Tuesday",
-        "Time": "8:30pm - 9pm",
-        "Activity": "Dinner",
-        "Time Duration": "",
-    },
-    {
-        "Day": "Tuesday",
-        "Time": "9pm - 10:30pm",
-        "Activity": "GATE study",
-        "Time Duration": "",
-    },
-    {
-        "Day": "Tuesday",
-        "Time": "10:30pm - 11pm",
-        "Activity": "Revision of day's topics",
-        "Time Duration": "",
-    },
-    {
-        "Day": "Tuesday",
-        "Time": "11pm",
-        "Activity": "Sleep",
-        "Time Duration": "",
-    },
-
-    # Wednesday
-    {
-        "Day": "Wednesday",
-        "Time": "7am - 8am",
-        "Activity": "Morning Routine",
-        "Time Duration": "",
-    },
-    {
-        "Day": "Wednesday",
-        "Time": "8am - 9am",
-        "Activity": "Travel",
-        "Time Duration": "",
-    },
-    {
-        "Day": "Wednesday",
-        "Time": "9am - 12pm",
-        "Activity": "College lectures",
-        "Time Duration": "",
-    },
-    {
-        "Day": "Wednesday",
-        "Time": "12pm - 1pm",
-        "Activity": "Lunch Break",
-        "Time Duration": "",
-    },
-    {
-        "Day": "Wednesday",
-        "Time": "1pm - 4pm",
-        "Activity": "College lectures",
-        "Time Duration": "",
-    },
-    {
-        "Day": "Wednesday",
-        "Time": "4pm - 5pm",
-        "Activity": "Evening Routine",
-        "Time Duration": "",
-    },
-    {
-        "Day": "Wednesday",
-        "Time": "5pm - 6pm",
-        "Activity": "GATE study",
-        "Time Duration": "",
-    },
-    {
-        "Day": "Wednesday",
-        "Time": "6pm - 7pm",
-        "Activity": "Break/Snacks",
-        "Time Duration": "",
-    },
-    {
-        "Day": "Wednesday",
-        "Time": "7pm - 8:30pm",
-        "Activity": "GATE study",
-        "Time Duration": "",
-    },
-    {
-        "Day": "Wednesday",
-        "Time": "8:30pm - 9pm",
-        "Activity": "Dinner",
-        "Time Duration": "",
-    },
-    {
-        "Day": "Wednesday",
-        "Time": "9pm - 10:30pm",
-        "Activity": "GATE study",
-        "Time Duration": "",
-    },
-    {
-        "Day": "Wednesday",
-        "Time": "10:30pm - 11pm",
-        "Activity": "Revision of day's topics",
-        "Time Duration": "",
-    },
-    {
-        "Day": "Wednesday",
-        "Time": "11pm",
-        "Activity": "Sleep",
-        "Time Duration": "",
-    },
-
-    # Thursday
-    {
-        "Day": "Thursday",
-        "Time": "7am - 8am",
-        "Activity": "Morning Routine",
-        "Time Duration": "",
-    },
-    {
-        "Day": "Thursday",
-        "Time": "8am - 9am",
-        "Activity": "Travel",
-        "Time Duration": "",
-    },
-    {
-        "Day": "Thursday",
-        "Time": "9am - 12pm",
-        "Activity": "College lectures",
-        "Time Duration": "",
-    },
-    {
-        "Day": "Thursday",
-        "Time": "12pm - 1pm",
-        "Activity": "Lunch Break",
-        "Time Duration": "",
-    },
-    {
-        "Day": "Thursday",
-        "Time": "1pm - 4pm",
-        "Activity": "College lectures",
-        "Time Duration": "",
-    },
-    {
-        "Day": "Thursday",
-        "Time": "4pm - 5pm",
-        "Activity": "Evening Routine",
-        "Time Duration": "",
-    },
-    {
-        "Day": "Thursday",
-        "Time": "5pm - 6pm",
-        "Activity": "GATE study",
-        "Time Duration": "",
-    },
-    {
-        "Day": "Thursday",
-        "Time": "6pm - 7pm",
-        "Activity": "Break/Snacks",
-        "Time Duration": "",
-    },
-    {
-        "Day": "Thursday",
-        "Time": "7pm - 8:30pm",
-        "Activity": "GATE study",
-        "Time Duration": "",
-    },
-    {
-        "Day": "Thursday",
-        "Time": "8:30pm - 9pm",
-        "Activity": "Dinner",
-        "Time Duration": "",
-    },
-    {
-        "Day": "Thursday",
-        "Time": "9pm - 10:30pm",
-        "Activity": "GATE study",
-        "Time Duration": "",
-    },
-    {
-        "Day": "Thursday",
-        "Time": "10:30pm - 11pm",
-        "Activity": "Revision of day's topics",
-        "Time Duration": "",
-    },
-    {
-        "Day": "Thursday",
-        "Time": "11pm",
-        "Activity": "Sleep",
-        "Time Duration": "",
-    },
-
-    # Friday
-    {
-        "Day": "Friday",
-        "Time": "7am - 8am",
-        "Activity": "Morning Routine",
-        "Time Duration": "",
-    },
-    {
-        "Day": "Friday",
-        "Time": "8am - 9am",
-        "Activity": "Travel",
-        "Time Duration": "",
-    },
-    {
-        "Day": "Friday",
-        "Time": "9am - 12pm",
-        "Activity": "College lectures",
-        "Time Duration": "",
-    },
-    {
-        "Day": "Friday",
-        "Time": "12pm - 1pm",
-        "Activity": "Lunch Break",
-        "Time Duration": "",
-    },
-    {
-        "Day": "Friday",
-        "Time": "1pm - 4pm",
-        "Activity": "College lectures",
-        "Time Duration": "",
-    },
-    {
-        "Day": "Friday",
-        "Time": "4pm - 5pm",
-        "Activity": "Evening Routine",
-        "Time Duration": "",
-    },
-    {
-        "Day": "Friday",
-        "Time": "5pm - 6pm",
-        "Activity": "GATE study",
-        "Time Duration": "",
-    },
-    {
-        "Day": "Friday",
-        "Time": "6pm - 7pm",
-        "Activity": "Break/Snacks",
-        "Time Duration": "",
-    },
-    {
-        "Day": "Friday",
-        "Time": "7pm - 8:30pm",
-        "Activity": "GATE study",
-        "Time Duration": "",
-    },
-    {
-        "Day": "Friday",
-        "Time": "8:30pm - 9pm",
-        "Activity": "Dinner",
-        "Time Duration": "",
-    },
-    {
-        "Day": "Friday",
-        "Time": "9pm - 10:30pm",
-        "Activity": "GATE study",
-        "Time Duration": "",
-    },
-    {
-        "Day": "Friday",
-        "Time": "10:30pm - 11pm",
-        "Activity": "Revision of day's topics",
-        "Time Duration": "",
-    },
-    {
-        "Day": "Friday",
-        "Time": "11pm",
-        "Activity": "Sleep",
-        "Time Duration": "",
-    },
-
-    # Saturday
-    {
-        "Day": "Saturday",
-        "Time": "7am - 8am",
-        "Activity": "Morning Routine",
-        "Time Duration": "",
-    },
-    {
-        "Day": "Saturday",
-        "Time": "8am - 9am",
-        "Activity": "GATE study",
-        "Time Duration": "",
-    },
-    {
-        "Day": "Saturday",
-        "Time": "9am - 10:30am",
-        "Activity": "GATE study",
-        "Time Duration": "",
-    },
-    {
-        "Day": "Saturday",
-        "Time": "10:30am - 11am",
-        "Activity": "Break/Snacks",
-        "Time Duration": "",
-    },
-    {
-        "Day": "Saturday",
-        "Time": "11am - 12:30pm",
-        "Activity": "GATE study",
-        "Time Duration": "",
-    },
-    {
-        "Day": "Saturday",
-        "Time": "12:30pm - 1:30pm",
-        "Activity": "Lunch Break",
-        "Time Duration": "",
-    },
-    {
-        "Day": "Saturday",
-        "Time": "1:30pm - 3pm",
-        "Activity": "GATE study",
-        "Time Duration": "",
-    },
-    {
-        "Day": "Saturday",
-        "Time": "3pm - 4pm",
-        "Activity": "Revision of important topics",
-        "Time Duration": "",
-    },
-    {
-        "Day": "Saturday",
-        "Time": "4pm - 5pm",
-        "Activity": "Mock test",
-        "Time Duration": "",
-    },
-    {
-        "Day": "Saturday",
-        "Time": "5pm - 6pm",
-        "Activity": "Analysis of mock test",
-        "Time Duration": "",
-    },
-    {
-        "Day": "Saturday",
-        "Time": "6pm - 7pm",
-        "Activity": "Break/Snacks",
-        "Time Duration": "",
-    },
-    {
-        "Day": "Saturday",
-        "Time": "7pm - 8:30pm",
-        "Activity": "GATE study",
-        "Time Duration": "",
-    },
-    {
-        "Day": "Saturday",
-        "Time": "8:30pm - 9pm",
-        "Activity": "Dinner",
-        "Time Duration": "",
-    },
-    {
-        "Day": "Saturday",
-        "Time": "9pm - 10:30pm",
-        "Activity": "GATE study",
-        "Time Duration": "",
-    },
-    {
-        "Day": "Saturday",
-        "Time": "10:30pm - 11pm",
-        "Activity": "Revision of day's topics",
-        "Time Duration": "",
-    },
-    {
-        "Day": "Saturday",
-        "Time": "11pm",
-        "Activity": "Sleep",
-        "Time Duration": "",
-    },
-
-    # Sunday
-    {
-        "Day": "Sunday",
-        "Time": "7am - 8am",
-        "Activity": "Morning Routine",
-        "Time Duration": "",
-    },
-    {
-        "Day": "Sunday",
-        "Time": "8am - 9am",
-        "Activity": "GATE study",
-        "Time Duration": "",
-    },
-    {
-        "Day": "Sunday",
-        "Time": "9am - 10:30am",
-        "Activity": "GATE study",
-        "Time Duration": "",
-    },
-    {
-        "Day": "Sunday",
-        "Time": "10:30am - 11am",
-        "Activity": "Break/Snacks",
-        "Time Duration": "",
-    },
-    {
-        "Day": "Sunday",
-        "Time": "11am - 12:30pm",
-        "Activity": "GATE study",
-        "Time Duration": "",
-    },
-    {
-        "Day": "Sunday",
-        "Time": "12:30pm - 1:30pm",
-        "Activity": "Lunch Break",
-        "Time Duration": "",
-    },
-    {
-        "Day": "Sunday",
-        "Time": "1:30pm - 3pm",
-        "Activity": "GATE study",
-        "Time Duration": "",
-    },
-    {
-        "Day": "Sunday",
-        "Time": "3pm - 4pm",
-        "Activity": "Revision of important topics",
-        "Time Duration": "",
-    },
-    {
-        "Day": "Sunday",
-        "Time": "4pm - 5pm",
-        "Activity": "Mock test",
-        "Time Duration": "",
-    },
-    {
-        "Day": "Sunday",
-        "Time": "5pm - 6pm",
-        "Activity": "Analysis of mock test",
-        "Time Duration": "",
-    },
-    {
-        "Day": "Sunday",
-        "Time": "6pm - 7pm",
-        "Activity": "Break/Snacks",
-        "Time Duration": "",
-    },
-    {
-        "Day": "Sunday",
-        "Time": "7pm - 8:30pm",
-        "Activity": "GATE study",
-        "Time Duration": "",
-    },
-    {
-        "Day": "Sunday",
-        "Time": "8:30pm - 9pm",
-        "Activity": "Dinner",
-        "Time Duration": "",
-    },
-    {
-        "Day": "Sunday",
-        "Time": "9pm - 10:30pm",
-        "Activity": "GATE study",
-        "Time Duration": "",
-    },
-    {
-        "Day": "Sunday",
-        "Time": "10:30pm - 11pm",
-        "Activity": "Revision of day's topics",
-        "Time Duration": "",
-    },
-    {
-        "Day": "Sunday",
-        "Time": "11pm",
-        "Activity": "Sleep",
-        "Time Duration": "",
-    },
-]
-
-# Create the timetable table in the database and insert the data
-create_table()
-insert_timetable_data(timetable)
-
-# Retrieve data from the database and calculate the reward
-conn = sqlite3.connect("timetable.db")
-cursor = conn.cursor()
-
-cursor.execute("SELECT * FROM timetable")
-timetable_data = cursor.fetchall()
-
-timetable_data_as_dict = convert_to_dict(timetable_data)
-
-reward = calculate_reward_to_transfer(timetable_data_as_dict)
-print("Total reward: {} rupees".format(reward))
-
-completed_gate_study = ask_gate_study_completion()
-
-if completed_gate_study:
-    print("Great! You completed the GATE study as per the timetable for today.")
-else:
-    print("Oops! Looks like you missed your GATE study as per the timetable for today.")
-
-print("Total reward to be transferred: {} rupees".format(reward if completed_gate_study else 0))
-
-conn.close()
+if __name__ == "__main__":
+    # Let modules that "import Timetable" share this module's database settings
+    sys.modules.setdefault("Timetable", sys.modules[__name__])
+    main()
@@ -0,0 +1,112 @@
+import asyncio
+import itertools
+import queue
+import threading
+from datetime import datetime
+
+import Timetable
+
+# Most requests a worker runs before handing their results back to the event loop
+BATCH_SIZE = 256
+
+# Thread that owns one database connection and runs queued calls against it; results are
+# handed back to the event loop in batches so hundreds of waiting coroutines cost one wakeup
+class DatabaseWorker(threading.Thread):
+    def __init__(self, name):
+        super().__init__(name=name, daemon=True)
+        self.requests = queue.SimpleQueue()
+
+    def submit(self, func, *args, **kwargs):
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        self.requests.put((func, args, kwargs, future, loop))
+        return future
+
+    def stop(self):
+        self.requests.put(None)
+
+    def run(self):
+        running = True
+        while running:
+            batch = [self.requests.get()]
+            while len(batch) < BATCH_SIZE:
+                try:
+                    batch.append(self.requests.get_nowait())
+                except queue.Empty:
+                    break
+
+            results = {}
+            for request in batch:
+                if request is None:
+                    running = False
+                    continue
+                func, args, kwargs, future, loop = request
+                try:
+                    outcome = (future, func(*args, **kwargs), None)
+                except Exception as error:
+                    outcome = (future, None, error)
+                results.setdefault(loop, []).append(outcome)
+
+            for loop, outcomes in results.items():
+                loop.call_soon_threadsafe(_deliver, outcomes)
+
+# Function run on the event loop to resolve a batch of futures
+def _deliver(outcomes):
+    for future, result, error in outcomes:
+        if future.cancelled():
+            continue
+        if error is not None:
+            future.set_exception(error)
+        else:
+            future.set_result(result)
+
+# Async counterpart of the Timetable API: one writer thread serialises every mutation
+# and a few reader threads answer queries concurrently (WAL lets them read while it writes)
+class AsyncTimetable:
+    def __init__(self, readers=2):
+        self.writer = DatabaseWorker("timetable-writer")
+        self.readers = [DatabaseWorker("timetable-reader-{}".format(i)) for i in range(readers)]
+        self._next_reader = itertools.cycle(self.readers)
+        for worker in [self.writer] + self.readers:
+            worker.start()
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc_info):
+        self.close()
+
+    # Function to stop the worker threads once their queued requests are done
+    def close(self):
+        for worker in [self.writer] + self.readers:
+            worker.stop()
+
+    def _read(self, func, *args, **kwargs):
+        return next(self._next_reader).submit(func, *args, **kwargs)
+
+    async def create_table(self):
+        return await self.writer.submit(Timetable.create_table)
+
+    async def bulk_insert(self, slots, on_conflict="ignore", validate=False):
+        return await self.writer.submit(Timetable.bulk_insert_timetable_data, list(slots), on_conflict, validate)
+
+    async def mark_completion(self, day, time, user_id=Timetable.DEFAULT_USER_ID, completed_date=None):
+        return await self.writer.submit(Timetable.mark_gate_study_completion, day, time, user_id, completed_date)
+
+    async def unmark_completion(self, day, time, user_id=Timetable.DEFAULT_USER_ID, completed_date=None):
+        return await self.writer.submit(Timetable.unmark_gate_study_completion, day, time, user_id, completed_date)
+
+    async def reward(self, user_id=Timetable.DEFAULT_USER_ID, period="all", period_key="", reward_per_hour=10):
+        return await self._read(Timetable.get_reward_to_transfer, user_id, period, period_key, reward_per_hour)
+
+    async def reward_for_range(self, start_date=None, end_date=None, user_id=None, reward_per_hour=10):
+        return await self._read(Timetable.calculate_reward_for_range, start_date, end_date, user_id, reward_per_hour)
+
+    # Slots active at the given moment (default: now)
+    async def current_slots(self, now=None):
+        now = now or datetime.now()
+        return await self._read(_current_slots, now.strftime("%A"), now.hour * 60 + now.minute)
+
+# Function run on a reader thread to look up the active slots in the cached index
+def _current_slots(day, minute):
+    return Timetable.get_timetable_index().active(day, minute)
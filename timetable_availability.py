@@ -0,0 +1,169 @@
+import argparse
+import sqlite3
+from functools import lru_cache
+
+import Timetable
+
+MINUTES_PER_DAY = 24 * 60
+# Bitmap with every minute of the day set
+FULL_DAY = (1 << MINUTES_PER_DAY) - 1
+
+# Activity classes, matched by the first keyword contained in the activity; activities
+# matching none of them fall into "other"
+ACTIVITY_CLASSES = (
+    ("study", ("GATE study", "Revision", "Mock test")),
+    ("break", ("Break", "Snacks")),
+    ("sleep", ("Sleep",)),
+)
+# Classes whose minutes still count as free when looking for common study time
+FREE_CLASSES = ("break",)
+
+# Function to get the activity class of an activity
+@lru_cache(maxsize=1024)
+def activity_class(activity):
+    for name, keywords in ACTIVITY_CLASSES:
+        if any(keyword in activity for keyword in keywords):
+            return name
+    return "other"
+
+# Function to turn the minutes [start_min, end_min) into a bitmap (bit i is minute i)
+def minutes_bitmap(start_min, end_min):
+    return ((1 << (end_min - start_min)) - 1) << start_min
+
+# Function to build {day: {activity class: busy bitmap}} from any iterable of slots
+# Open-ended slots run until midnight; slots past midnight continue on the next weekday
+def day_bitmaps(timetable_data):
+    days = {}
+    for slot in timetable_data:
+        start_min, end_min = Timetable.slot_minutes(slot)
+        if start_min is None:
+            continue
+        if end_min is None:
+            end_min = MINUTES_PER_DAY
+        name = activity_class(slot["Activity"])
+
+        classes = days.setdefault(slot["Day"], {})
+        classes[name] = classes.get(name, 0) | minutes_bitmap(start_min, min(end_min, MINUTES_PER_DAY))
+        if end_min > MINUTES_PER_DAY and slot["Day"] in Timetable.WEEKDAYS:
+            next_day = Timetable.WEEKDAYS[(Timetable.WEEKDAYS.index(slot["Day"]) + 1) % 7]
+            classes = days.setdefault(next_day, {})
+            classes[name] = classes.get(name, 0) | minutes_bitmap(0, end_min - MINUTES_PER_DAY)
+    return days
+
+# Function to get the free minutes of a day from its class bitmaps
+def free_bitmap(classes, free_classes=FREE_CLASSES):
+    busy = 0
+    for name, bitmap in classes.items():
+        if name not in free_classes:
+            busy |= bitmap
+    return FULL_DAY & ~busy
+
+# Function to find the longest run of set bits, as (start_min, end_min) of the earliest
+# such run, or None for an empty bitmap
+# runs[i] has bit m set when minutes m .. m + 2**i - 1 are all set, so the length is
+# found with O(log 1440) shifts and ANDs instead of one per minute
+def longest_run(bitmap):
+    if not bitmap:
+        return None
+    runs = [bitmap]
+    while True:
+        step = 1 << (len(runs) - 1)
+        doubled = runs[-1] & (runs[-1] >> step)
+        if not doubled:
+            break
+        runs.append(doubled)
+
+    length = 1 << (len(runs) - 1)
+    starts = runs[-1]
+    for i in range(len(runs) - 2, -1, -1):
+        longer = starts & (runs[i] >> length)
+        if longer:
+            starts = longer
+            length += 1 << i
+    start_min = (starts & -starts).bit_length() - 1
+    return start_min, start_min + length
+
+# Cache of each user's class bitmaps, so group queries are a few bitwise operations per user
+class AvailabilityIndex:
+    def __init__(self):
+        self.users = {}
+        # {(day, free classes): {user_id: free bitmap}}, filled in as queries need them
+        self._free = {}
+
+    # Function to (re)compute a user's bitmaps from their slots
+    def set_user(self, user_id, timetable_data):
+        self.remove_user(user_id)
+        self.users[user_id] = day_bitmaps(timetable_data)
+
+    def remove_user(self, user_id):
+        self.users.pop(user_id, None)
+        for free in self._free.values():
+            free.pop(user_id, None)
+
+    # Function to get a user's free bitmap for a day (a user with no slots that day is free)
+    def free(self, user_id, day, free_classes=FREE_CLASSES):
+        free = self._free.setdefault((day, free_classes), {})
+        bitmap = free.get(user_id)
+        if bitmap is None:
+            bitmap = free[user_id] = free_bitmap(self.users[user_id].get(day, {}), free_classes)
+        return bitmap
+
+    # Function to AND the free bitmaps of the users, optionally limited to [start_min, end_min)
+    def common_free(self, user_ids, day, free_classes=FREE_CLASSES, start_min=0, end_min=MINUTES_PER_DAY):
+        free = self._free.get((day, free_classes), {})
+        common = minutes_bitmap(start_min, end_min)
+        for user_id in user_ids:
+            bitmap = free.get(user_id)
+            common &= self.free(user_id, day, free_classes) if bitmap is None else bitmap
+            if not common:
+                break
+        return common
+
+    # Longest window on the day when all users are free, as (start_min, end_min) or None
+    def longest_common_free_window(self, user_ids, day, free_classes=FREE_CLASSES,
+                                   start_min=0, end_min=MINUTES_PER_DAY):
+        return longest_run(self.common_free(user_ids, day, free_classes, start_min, end_min))
+
+    # Number of minutes on the day when all users are free
+    def common_free_minutes(self, user_ids, day, free_classes=FREE_CLASSES):
+        return self.common_free(user_ids, day, free_classes).bit_count()
+
+# Function to return the bitmaps of the timetable table, rebuilt only when the database changed
+def timetable_bitmaps():
+    return _timetable_bitmaps(Timetable.database_version())
+
+@lru_cache(maxsize=1)
+def _timetable_bitmaps(version):
+    rows = Timetable.get_connection().execute("SELECT * FROM timetable")
+    return day_bitmaps(Timetable.convert_to_dict(rows))
+
+# Function to build an index from the per-user shard databases (see timetable_shards)
+def index_from_shards(router, user_ids):
+    index = AvailabilityIndex()
+    for user_id in user_ids:
+        conn = sqlite3.connect("file:{}?mode=ro".format(router.path_for(user_id)), uri=True)
+        try:
+            index.set_user(user_id, Timetable.convert_to_dict(conn.execute("SELECT * FROM timetable")))
+        finally:
+            conn.close()
+    return index
+
+
+if __name__ == "__main__":
+    import timetable_shards
+
+    arg_parser = argparse.ArgumentParser(description="Longest common free window of several users")
+    arg_parser.add_argument("day", choices=Timetable.WEEKDAYS)
+    arg_parser.add_argument("users", nargs="+")
+    arg_parser.add_argument("--dir", default=timetable_shards.SHARD_DIR, help="shard directory")
+    arg_parser.add_argument("--buckets", type=int, help="shards are hash buckets (see timetable_shards)")
+    args = arg_parser.parse_args()
+
+    index = index_from_shards(timetable_shards.ShardRouter(args.dir, args.buckets), args.users)
+    window = index.longest_common_free_window(args.users, args.day)
+    if window is None:
+        print("No common free time on {}".format(args.day))
+    else:
+        start_min, end_min = window
+        print("{} {:02d}:{:02d} - {:02d}:{:02d} ({} minutes)".format(
+            args.day, *divmod(start_min, 60), *divmod(end_min, 60), end_min - start_min))
@@ -0,0 +1,533 @@
+import argparse
+import asyncio
+import json
+import multiprocessing
+import os
+import platform
+import random
+import resource
+import sqlite3
+import subprocess
+import sys
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime, timedelta
+
+import Timetable
+
+# Function to generate n unique synthetic slots (48 half-hour slots per synthetic day)
+def generate_slots(n):
+    for i in range(n):
+        start = (i % 48) * 30
+        yield {
+            "Day": "Day{}".format(i // 48),
+            "Time": "{}:{:02d} - {}:{:02d}".format(*divmod(start, 60), *divmod((start + 30) % 1440, 60)),
+            "Activity": "GATE study" if i % 3 == 0 else "Break",
+            "Time Duration": "",
+        }
+
+# The row-at-a-time loop insert_timetable_data used before the bulk path, kept as a baseline
+def legacy_insert_timetable_data(timetable):
+    conn = sqlite3.connect(Timetable.DB_PATH)
+    cursor = conn.cursor()
+
+    for day_data in timetable:
+        day = day_data["Day"]
+        slot_time = day_data["Time"]
+        activity = day_data["Activity"]
+        time_duration = day_data["Time Duration"]
+
+        cursor.execute("SELECT * FROM timetable WHERE day=? AND time=?", (day, slot_time))
+        if cursor.fetchone() is None:
+            cursor.execute("INSERT INTO timetable (day, time, activity, time_duration) VALUES (?, ?, ?, ?)", (day, slot_time, activity, time_duration))
+
+    conn.commit()
+    conn.close()
+
+# Function to delete the benchmark database and its WAL files
+def reset_database():
+    Timetable.close_connections()
+    for suffix in ("", "-wal", "-shm"):
+        if os.path.exists(Timetable.DB_PATH + suffix):
+            os.remove(Timetable.DB_PATH + suffix)
+
+# Function to time one insert run against a fresh database, returning rows/sec
+def time_insert(insert, n):
+    reset_database()
+    Timetable.create_table()
+
+    start = time.perf_counter()
+    insert(generate_slots(n))
+    elapsed = time.perf_counter() - start
+    return n / elapsed
+
+# Function to compare the legacy loop with the bulk insert at several sizes
+def bench_insert(sizes=(10_000, 100_000, 1_000_000)):
+    print("{:>10} {:>16} {:>16} {:>8}".format("slots", "loop rows/s", "bulk rows/s", "speedup"))
+    for n in sizes:
+        loop_rate = time_insert(legacy_insert_timetable_data, n)
+        bulk_rate = time_insert(Timetable.bulk_insert_timetable_data, n)
+        print("{:>10} {:>16,.0f} {:>16,.0f} {:>7.1f}x".format(n, loop_rate, bulk_rate, bulk_rate / loop_rate))
+
+# Function to generate n mixed time strings and ranges like the ones found in real timetables
+def generate_time_strings(n, seed=0):
+    rng = random.Random(seed)
+    samples = []
+    for _ in range(n):
+        hour = rng.randint(1, 12)
+        minute = rng.choice(("", ":00", ":15", ":30", ":45"))
+        start = "{}{}{}".format(hour, minute, rng.choice(("am", "pm", "AM", "PM", " pm")))
+        kind = rng.random()
+        if kind < 0.5:
+            samples.append(start)
+        elif kind < 0.95:
+            samples.append("{} - {}pm".format(start, rng.randint(1, 11)))
+        else:
+            samples.append("{}:{:02d}".format(rng.randint(0, 23), rng.randint(0, 59)))
+    return samples
+
+# The dateutil-based parse that parse_time_string used before the dedicated parser
+def legacy_parse_time_string(time_str):
+    from dateutil import parser
+
+    try:
+        return parser.parse(time_str).strftime("%I:%M%p")
+    except ValueError:
+        return None
+
+# Function to compare dateutil parsing with the dedicated parser on mixed inputs
+def bench_parse(n=1_000_000):
+    samples = generate_time_strings(n)
+
+    def legacy(sample):
+        for part in sample.split(" - "):
+            legacy_parse_time_string(part)
+
+    print("{:>10} {:>16} {:>16} {:>8}".format("inputs", "dateutil/s", "parser/s", "speedup"))
+    start = time.perf_counter()
+    for sample in samples:
+        legacy(sample)
+    legacy_rate = n / (time.perf_counter() - start)
+
+    Timetable.parse_time_minutes.cache_clear()
+    Timetable.parse_time_range.cache_clear()
+    start = time.perf_counter()
+    for sample in samples:
+        Timetable.parse_time_range(sample)
+    current_rate = n / (time.perf_counter() - start)
+    print("{:>10} {:>16,.0f} {:>16,.0f} {:>7.1f}x".format(n, legacy_rate, current_rate, current_rate / legacy_rate))
+
+
+# Script run in a fresh interpreter: imports Timetable with an audit hook that records
+# database connections and any file opened other than Python modules
+IMPORT_CHECK = """
+import sys, time
+io_events = []
+def hook(event, args):
+    if event == "sqlite3.connect" or (event == "open" and not str(args[0]).endswith((".py", ".pyc", ".so"))):
+        io_events.append((event, str(args[0])))
+sys.addaudithook(hook)
+start = time.perf_counter()
+import Timetable
+print((time.perf_counter() - start) * 1000)
+print(io_events)
+"""
+
+# Function to check that importing Timetable does no I/O and stays within the time budget
+def bench_import(budget_ms=50, runs=5):
+    timings = []
+    for _ in range(runs):
+        output = subprocess.run(
+            [sys.executable, "-c", IMPORT_CHECK],
+            cwd=os.path.dirname(os.path.abspath(Timetable.__file__)),
+            capture_output=True, text=True, check=True,
+        ).stdout.splitlines()
+        timings.append(float(output[0]))
+        if output[1] != "[]":
+            sys.exit("import Timetable did I/O: {}".format(output[1]))
+
+    best = min(timings)
+    print("import Timetable: {:.1f} ms (best of {}), budget {} ms, no I/O".format(best, runs, budget_ms))
+    if best > budget_ms:
+        sys.exit("import Timetable is over its {} ms budget".format(budget_ms))
+
+# Function to format minutes since midnight the way the timetable does ("7am", "8:30pm")
+def format_minutes(minutes):
+    hour, minute = divmod(minutes % (24 * 60), 60)
+    suffix = "am" if hour < 12 else "pm"
+    hour = (hour - 1) % 12 + 1
+    return "{}{}".format(hour, suffix) if minute == 0 else "{}:{:02d}{}".format(hour, minute, suffix)
+
+# Function to generate a synthetic timetable of users x weeks x 7 days x slots_per_day rows
+# Each (user, week, weekday) gets its own day key so every row is a distinct (day, time)
+def generate_timetable(users, weeks, slots_per_day, completed_ratio=0.3, seed=0):
+    rng = random.Random(seed)
+    length = (16 * 60) // slots_per_day
+    for user in range(users):
+        for week in range(weeks):
+            for weekday in Timetable.WEEKDAYS:
+                day = weekday if users == weeks == 1 else "{} u{} w{}".format(weekday, user, week)
+                for slot in range(slots_per_day):
+                    start = 7 * 60 + slot * length
+                    yield {
+                        "Day": day,
+                        "Time": "{} - {}".format(format_minutes(start), format_minutes(start + length)),
+                        "Activity": "GATE study" if slot % 3 == 0 else "Break",
+                        "Time Duration": "completed" if rng.random() < completed_ratio else "",
+                    }
+
+# Function to read this process's I/O counters (Linux only); SQLite reads served through
+# mmap do not go through read() and so are not counted, which is why the suite turns it off
+def read_io_counters():
+    try:
+        with open("/proc/self/io") as f:
+            counters = dict(line.split(": ") for line in f.read().splitlines())
+    except OSError:
+        return None
+    return int(counters["rchar"]), int(counters["wchar"])
+
+# Functions measured by the suite; each takes the generated rows and returns nothing
+def case_parse_time_string(rows):
+    for row in rows:
+        for part in row["Time"].split(" - "):
+            Timetable.parse_time_string(part)
+
+def case_insert_timetable_data(rows):
+    Timetable.insert_timetable_data(rows)
+
+def case_convert_to_dict(rows):
+    Timetable.convert_to_dict(Timetable.get_connection().execute("SELECT * FROM timetable").fetchall())
+
+# Looks up the GATE study slot active at the start of every row on a prebuilt index, as
+# check_gate_study_completion does for the current time (without marking the completion);
+# the synthetic day keys such as "Monday u0 w0" would never match now.strftime("%A")
+def case_check_gate_study_completion(rows):
+    for index, day, minute in rows:
+        next((slot for slot in index.active(day, minute) if "GATE study" in slot["Activity"]), None)
+
+def case_calculate_reward_to_transfer(rows):
+    Timetable.calculate_reward_to_transfer(rows)
+
+SUITE_CASES = {
+    "parse_time_string": case_parse_time_string,
+    "insert_timetable_data": case_insert_timetable_data,
+    "convert_to_dict": case_convert_to_dict,
+    "check_gate_study_completion": case_check_gate_study_completion,
+    "calculate_reward_to_transfer": case_calculate_reward_to_transfer,
+}
+
+# Function to run one suite case in the current (fresh) process and return its measurements
+# The case starts on a fresh connection, so its reads come from the file and not from the
+# cache the setup filled; the RSS peak of the setup is reported apart from the case's growth
+def run_suite_case(name, users, weeks, slots_per_day, db_path):
+    Timetable.configure_database(db_path, mmap_size=0)
+    reset_database()
+    Timetable.create_table()
+    rows = list(generate_timetable(users, weeks, slots_per_day))
+    if name != "insert_timetable_data":
+        Timetable.insert_timetable_data(rows)
+    if name in ("check_gate_study_completion", "calculate_reward_to_transfer"):
+        rows = Timetable.convert_to_dict(Timetable.get_connection().execute("SELECT * FROM timetable"))
+    if name == "check_gate_study_completion":
+        index = Timetable.TimetableIndex(rows)
+        rows = [(index, slot["Day"], Timetable.slot_minutes(slot)[0]) for slot in rows]
+    Timetable.close_connections()
+    page_size = Timetable.get_connection().execute("PRAGMA page_size").fetchone()[0]
+    Timetable.parse_time_minutes.cache_clear()
+    Timetable.parse_time_range.cache_clear()
+    setup_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+    io_before = read_io_counters()
+    start = time.perf_counter()
+    SUITE_CASES[name](rows)
+    wall = time.perf_counter() - start
+    io_after = read_io_counters()
+    peak_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    Timetable.close_connections()
+
+    result = {
+        "function": name,
+        "users": users,
+        "weeks": weeks,
+        "slots_per_day": slots_per_day,
+        "rows": len(rows),
+        "wall_s": wall,
+        "setup_rss_kb": setup_rss,
+        "peak_rss_kb": peak_rss,
+        "rss_growth_kb": peak_rss - setup_rss,
+        "pages_read": None,
+        "pages_written": None,
+    }
+    if io_before and io_after:
+        result["pages_read"] = (io_after[0] - io_before[0]) // page_size
+        result["pages_written"] = (io_after[1] - io_before[1]) // page_size
+    return result
+
+# Function to run every suite case at every size, each in a freshly spawned process so the
+# RSS figures belong to that case alone, and write the results as JSON
+def bench_suite(sizes, output, functions=None):
+    results = []
+    workdir = tempfile.mkdtemp(prefix="timetable-suite-")
+    context = multiprocessing.get_context("spawn")
+    print("{:<30} {:>10} {:>10} {:>13} {:>12} {:>10} {:>10}".format(
+        "function", "rows", "wall s", "setup RSS kB", "RSS +kB", "pages r", "pages w"))
+
+    for users, weeks, slots_per_day in sizes:
+        for name in functions or SUITE_CASES:
+            with ProcessPoolExecutor(max_workers=1, mp_context=context) as pool:
+                result = pool.submit(run_suite_case, name, users, weeks, slots_per_day,
+                                     os.path.join(workdir, "suite.db")).result()
+            results.append(result)
+            print("{function:<30} {rows:>10,} {wall_s:>10.4f} {setup_rss_kb:>13,} {rss_growth_kb:>12,} "
+                  "{pages_read!s:>10} {pages_written!s:>10}".format(**result))
+
+    report = {
+        "created": datetime.now().isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "sqlite": sqlite3.sqlite_version,
+        "platform": platform.platform(),
+        "results": results,
+    }
+    with open(output, "w") as f:
+        json.dump(report, f, indent=2)
+    print("Results written to {}".format(output))
+
+# Function to parse a "users x weeks x slots_per_day" size such as "10x4x13"
+def parse_size(text):
+    users, weeks, slots_per_day = (int(part) for part in text.lower().split("x"))
+    return users, weeks, slots_per_day
+
+# Function to compare AsyncTimetable with run_in_executor calls when many coroutines
+# query at once; returns nothing and prints queries/sec for both
+def bench_async(coroutines=500, queries=20):
+    import timetable_async
+
+    Timetable.create_table()
+    Timetable.insert_timetable_data(Timetable.load_sample_timetable())
+    now = datetime(2024, 1, 1, 17, 30)
+
+    async def executor_client(loop):
+        for _ in range(queries):
+            await loop.run_in_executor(None, Timetable.get_reward_to_transfer)
+            await loop.run_in_executor(None, timetable_async._current_slots, "Monday", 17 * 60 + 30)
+
+    async def async_client(db):
+        for _ in range(queries):
+            await db.reward()
+            await db.current_slots(now)
+
+    async def run():
+        loop = asyncio.get_running_loop()
+        start = time.perf_counter()
+        await asyncio.gather(*(executor_client(loop) for _ in range(coroutines)))
+        executor_rate = coroutines * queries * 2 / (time.perf_counter() - start)
+
+        async with timetable_async.AsyncTimetable() as db:
+            start = time.perf_counter()
+            await asyncio.gather(*(async_client(db) for _ in range(coroutines)))
+            async_rate = coroutines * queries * 2 / (time.perf_counter() - start)
+
+        print("{} coroutines: run_in_executor {:,.0f} queries/s, AsyncTimetable {:,.0f} queries/s".format(
+            coroutines, executor_rate, async_rate))
+
+    asyncio.run(run())
+
+# Function to compare per-user rewards from one database with the sharded batch runner
+# at 1, 2, 4, ... worker processes; returns nothing and prints completions/sec for each
+def bench_shards(users=2000, days=90, buckets=64):
+    import timetable_rewards
+    import timetable_shards
+
+    Timetable.create_table()
+    Timetable.insert_timetable_data(Timetable.load_sample_timetable())
+    conn = Timetable.get_connection()
+    gate_slots = conn.execute(
+        "SELECT day, start_min, end_min, activity FROM timetable WHERE activity='GATE study'"
+    ).fetchall()
+    first = datetime(2024, 1, 1).date()
+    rows = []
+    for offset in range(days):
+        completed_date = first + timedelta(days=offset)
+        weekday = Timetable.WEEKDAYS[completed_date.weekday()]
+        for user in range(users):
+            rows += [("user{}".format(user), completed_date.isoformat(), day, start_min, end_min, activity, "")
+                     for day, start_min, end_min, activity in gate_slots if day == weekday]
+    with Timetable.transaction() as conn:
+        conn.executemany("INSERT OR IGNORE INTO completions VALUES (?, ?, ?, ?, ?, ?, ?)", rows)
+    source_path = Timetable.DB_PATH
+
+    start = time.perf_counter()
+    timetable_rewards.calculate_rewards_sql(10, "user")
+    single_rate = len(rows) / (time.perf_counter() - start)
+    print("{:,} completions of {:,} users, one database: {:,.0f} completions/s".format(len(rows), users, single_rate))
+
+    router = timetable_shards.ShardRouter(os.path.join(os.path.dirname(source_path), "shards"), buckets)
+    timetable_shards.split_database(router, source_path)
+    workers = 1
+    while workers <= (os.cpu_count() or 1):
+        start = time.perf_counter()
+        timetable_shards.run_batch(router, 10, workers=workers)
+        rate = len(rows) / (time.perf_counter() - start)
+        print("{} shards, {} workers: {:,.0f} completions/s ({:.2f}x one database)".format(
+            buckets, workers, rate, rate / single_rate))
+        workers *= 2
+
+# The list-of-dicts conversion convert_to_dict used before Slot, kept as a baseline
+def legacy_convert_to_dict(data):
+    keys = ["Day", "Time", "Activity", "Time Duration", "Start Min", "End Min"]
+    return [dict(zip(keys, row)) for row in data]
+
+# Function to compare the memory per slot of dicts, Slot records and a SlotTable built
+# from the same database rows; returns nothing and prints bytes/slot for each
+def bench_memory(users=100, weeks=12, slots_per_day=13):
+    import gc
+    import tracemalloc
+
+    Timetable.create_table()
+    Timetable.insert_timetable_data(generate_timetable(users, weeks, slots_per_day))
+    conn = Timetable.get_connection()
+    count = conn.execute("SELECT COUNT(*) FROM timetable").fetchone()[0]
+
+    for name, convert in (("list of dicts", legacy_convert_to_dict),
+                          ("list of Slot", Timetable.convert_to_dict),
+                          ("SlotTable", Timetable.SlotTable.from_rows)):
+        gc.collect()
+        tracemalloc.start()
+        start = time.perf_counter()
+        slots = convert(conn.execute("SELECT * FROM timetable"))
+        elapsed = time.perf_counter() - start
+        size = tracemalloc.get_traced_memory()[0]
+        tracemalloc.stop()
+        print("{:<14} {:>10,} slots {:>8.1f} bytes/slot ({:.2f} s)".format(name, len(slots), size / count, elapsed))
+        del slots
+
+# Function to time the longest common free window of a group of users with synthetic
+# timetables (a random subset of half-hour to hour-and-a-half slots between 7am and 10pm)
+def bench_availability(users=500, queries=1000, seed=0):
+    import timetable_availability
+
+    rng = random.Random(seed)
+    index = timetable_availability.AvailabilityIndex()
+    start = time.perf_counter()
+    for user in range(users):
+        slots = []
+        minute = 7 * 60
+        while minute < 22 * 60:
+            length = rng.choice([30, 60, 90])
+            if rng.random() < 0.5:
+                slots.append({"Day": "Saturday", "Time": "{} - {}".format(format_minutes(minute), format_minutes(minute + length)),
+                              "Activity": rng.choice(["GATE study", "Break/Snacks", "College lectures"]),
+                              "Time Duration": ""})
+            minute += length
+        index.set_user(user, slots)
+    build = time.perf_counter() - start
+
+    user_ids = list(range(users))
+    window = index.longest_common_free_window(user_ids, "Saturday")
+    start = time.perf_counter()
+    for _ in range(queries):
+        index.longest_common_free_window(user_ids, "Saturday")
+    query = (time.perf_counter() - start) / queries
+    print("{} users: bitmaps built in {:.1f} ms, longest common free window {} in {:.1f} us".format(
+        users, build * 1000, window, query * 1e6))
+
+# Function to compare concurrent writer threads each committing their own completions
+# (with and without a busy timeout) against the same writes sent through a WriteQueue
+def bench_writers(writers=50, writes=40):
+    import threading
+    import timetable_writer
+
+    Timetable.create_table()
+    Timetable.insert_timetable_data(Timetable.load_sample_timetable())
+    first = datetime(2024, 1, 1).date()
+
+    def direct(writer, errors):
+        for i in range(writes):
+            try:
+                Timetable.mark_gate_study_completion("Monday", "7pm - 8:30pm", "w{}".format(writer),
+                                                     first + timedelta(weeks=i))
+            except sqlite3.OperationalError:
+                errors.append(writer)
+
+    def queued(writer, errors, write_queue):
+        for i in range(writes):
+            try:
+                write_queue.mark_completion("Monday", "7pm - 8:30pm", "w{}".format(writer),
+                                            first + timedelta(weeks=i)).result()
+            except sqlite3.OperationalError:
+                errors.append(writer)
+
+    for label, busy_timeout in (("direct, busy_timeout=0", 0), ("direct, busy_timeout=5000", 5000), ("WriteQueue", 5000)):
+        Timetable.configure_database(busy_timeout=busy_timeout)
+        with Timetable.transaction() as conn:
+            conn.execute("DELETE FROM completions")
+        errors = []
+        write_queue = timetable_writer.WriteQueue() if label == "WriteQueue" else None
+        threads = [
+            threading.Thread(target=direct, args=(writer, errors)) if write_queue is None
+            else threading.Thread(target=queued, args=(writer, errors, write_queue))
+            for writer in range(writers)
+        ]
+        start = time.perf_counter()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        elapsed = time.perf_counter() - start
+        if write_queue is not None:
+            write_queue.close()
+        stored = Timetable.get_connection().execute("SELECT COUNT(*) FROM completions").fetchone()[0]
+        print("{:<26} {} writers: {:,.0f} writes/s, {} 'database is locked' errors, {} of {} stored".format(
+            label, writers, stored / elapsed, len(errors), stored, writers * writes))
+
+if __name__ == "__main__":
+    arg_parser = argparse.ArgumentParser(description="Benchmarks for Timetable.py")
+    subparsers = arg_parser.add_subparsers(dest="benchmark", required=True)
+    subparsers.add_parser("insert", help="legacy loop vs bulk insert").add_argument(
+        "sizes", nargs="*", type=int, default=[10_000, 100_000, 1_000_000])
+    subparsers.add_parser("parse", help="dateutil vs the dedicated time parser").add_argument(
+        "count", nargs="?", type=int, default=1_000_000)
+    subparsers.add_parser("import", help="import time and I/O of 'import Timetable'").add_argument(
+        "budget_ms", nargs="?", type=float, default=50)
+    subparsers.add_parser("async", help="AsyncTimetable vs run_in_executor").add_argument(
+        "coroutines", nargs="?", type=int, default=500)
+    subparsers.add_parser("memory", help="bytes per slot of dicts, Slot and SlotTable").add_argument(
+        "size", nargs="?", type=parse_size, metavar="USERSxWEEKSxSLOTS", default=(100, 12, 13))
+    subparsers.add_parser("writers", help="concurrent writer threads vs the WriteQueue").add_argument(
+        "writers", nargs="?", type=int, default=50)
+    subparsers.add_parser("availability", help="longest common free window of a group").add_argument(
+        "users", nargs="?", type=int, default=500)
+    shards_parser = subparsers.add_parser("shards", help="one database vs the sharded batch runner")
+    shards_parser.add_argument("users", nargs="?", type=int, default=2000)
+    shards_parser.add_argument("--days", type=int, default=90)
+    shards_parser.add_argument("--buckets", type=int, default=64)
+    suite_parser = subparsers.add_parser("suite", help="every hot path at several sizes, written as JSON")
+    suite_parser.add_argument("sizes", nargs="*", type=parse_size, metavar="USERSxWEEKSxSLOTS",
+                              default=[(1, 1, 13), (10, 4, 13), (100, 12, 13), (1000, 12, 13)])
+    suite_parser.add_argument("--output", default="bench_results.json")
+    suite_parser.add_argument("--function", action="append", choices=sorted(SUITE_CASES), dest="functions")
+    args = arg_parser.parse_args()
+
+    if args.benchmark == "suite":
+        bench_suite(args.sizes, args.output, args.functions)
+        sys.exit()
+
+    # Benchmarks run against a scratch database, never the real timetable.db
+    Timetable.configure_database(os.path.join(tempfile.mkdtemp(prefix="timetable-bench-"), "timetable.db"))
+    if args.benchmark == "insert":
+        bench_insert(args.sizes)
+    elif args.benchmark == "parse":
+        bench_parse(args.count)
+    elif args.benchmark == "async":
+        bench_async(args.coroutines)
+    elif args.benchmark == "writers":
+        bench_writers(args.writers)
+    elif args.benchmark == "availability":
+        bench_availability(args.users)
+    elif args.benchmark == "memory":
+        bench_memory(*args.size)
+    elif args.benchmark == "shards":
+        bench_shards(args.users, args.days, args.buckets)
+    else:
+        bench_import(args.budget_ms)
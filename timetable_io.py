@@ -0,0 +1,228 @@
+import csv
+import itertools
+import json
+import os
+import sys
+import time
+from datetime import date, datetime
+
+import Timetable
+
+# Column order used for CSV files and JSONL keys, matching the timetable dicts
+FIELDS = ["Day", "Time", "Activity", "Time Duration"]
+FORMATS = {".csv": "csv", ".jsonl": "jsonl", ".ndjson": "jsonl"}
+
+# Function to work out the file format from the argument or the file extension
+def _file_format(path, file_format):
+    file_format = file_format or FORMATS.get(os.path.splitext(path)[1].lower())
+    if file_format not in ("csv", "jsonl"):
+        raise ValueError("unknown timetable format for {!r}; use .csv or .jsonl".format(path))
+    return file_format
+
+# Generator yielding (line number, slot dict) pairs from a CSV or JSONL file, one line at a time
+def read_slots(path, file_format=None):
+    file_format = _file_format(path, file_format)
+    with open(path, newline="", encoding="utf-8") as f:
+        yield from _read_records(f, file_format)
+
+# Generator yielding (line number, dict) pairs from an open CSV or JSONL file
+# A JSONL line that does not decode is yielded as its ValueError, so the caller decides
+# whether one bad line rejects the file or only itself
+def _read_records(f, file_format):
+    if file_format == "csv":
+        reader = csv.DictReader(f)
+        for row in reader:
+            yield reader.line_num, row
+    else:
+        for line_number, line in enumerate(f, 1):
+            if line.strip():
+                try:
+                    yield line_number, json.loads(line)
+                except ValueError as error:
+                    yield line_number, ValueError("invalid JSON: {}".format(error))
+
+# Generator that checks each slot, raising ValueError (or skipping it when skip_invalid is set)
+# for lines that are not JSON objects, rows without a day, or with a time that does not parse
+def validate_slots(numbered_slots, skip_invalid=False):
+    for line_number, slot in numbered_slots:
+        if not isinstance(slot, dict):
+            if not skip_invalid:
+                raise ValueError("line {}: invalid timetable slot: {}".format(
+                    line_number, slot if isinstance(slot, ValueError) else "not a JSON object"))
+            continue
+        day = (slot.get("Day") or "").strip()
+        time_str = (slot.get("Time") or "").strip()
+        if day and time_str and Timetable.parse_time_range(time_str)[0] is not None:
+            yield {
+                "Day": day,
+                "Time": time_str,
+                "Activity": slot.get("Activity") or "",
+                "Time Duration": slot.get("Time Duration") or "",
+            }
+        elif not skip_invalid:
+            raise ValueError("line {}: invalid timetable slot {!r}".format(line_number, slot))
+
+# Generator splitting an iterable into lists of at most size items
+def chunked(iterable, size):
+    iterator = iter(iterable)
+    while True:
+        chunk = list(itertools.islice(iterator, size))
+        if not chunk:
+            return
+        yield chunk
+
+# Function to stream a CSV or JSONL file into the timetable table in fixed-size batches
+# progress(rows, rows_per_sec) is called after every batch; returns the summed insert counts
+# validate=True checks every batch for overlapping, zero-length and unparseable slots
+def import_timetable(path, file_format=None, on_conflict="ignore", batch_size=10000,
+                     skip_invalid=False, progress=None, validate=False):
+    Timetable.create_table()
+    totals = {"inserted": 0, "updated": 0, "skipped": 0}
+    rows = 0
+    start = time.perf_counter()
+
+    for chunk in chunked(validate_slots(read_slots(path, file_format), skip_invalid), batch_size):
+        counts = Timetable.bulk_insert_timetable_data(chunk, on_conflict, validate)
+        for key in totals:
+            totals[key] += counts[key]
+        rows += len(chunk)
+        if progress is not None:
+            progress(rows, rows / max(time.perf_counter() - start, 1e-9))
+
+    return totals
+
+# Function to stream the timetable table to a CSV or JSONL file; returns the number of rows
+def export_timetable(path, file_format=None):
+    file_format = _file_format(path, file_format)
+    # Rows come back in insertion order straight from the table, so nothing is sorted in memory
+    cursor = Timetable.get_connection().execute("SELECT day, time, activity, time_duration FROM timetable")
+
+    rows = 0
+    with open(path, "w", newline="", encoding="utf-8") as f:
+        writer = csv.writer(f) if file_format == "csv" else None
+        if writer is not None:
+            writer.writerow(FIELDS)
+        for row in cursor:
+            if writer is not None:
+                writer.writerow(row)
+            else:
+                f.write(json.dumps(dict(zip(FIELDS, row))) + "\n")
+            rows += 1
+    return rows
+
+# Function to create the table remembering every ingested completion event by its id,
+# so feeding the same events again changes nothing
+def create_event_table():
+    with Timetable.transaction() as conn:
+        conn.execute('''
+            CREATE TABLE IF NOT EXISTS completion_events (
+                event_id TEXT PRIMARY KEY,
+                user_id TEXT,
+                date TEXT,
+                start_min INTEGER,
+                end_min INTEGER,
+                activity TEXT,
+                ingested_at TEXT
+            )
+        ''')
+
+# Generator yielding (line number, event dict) pairs from a CSV or JSONL file, or from
+# stdin for "-" (JSONL unless file_format says otherwise); undecodable lines come as ValueErrors
+def read_events(path, file_format=None):
+    if path == "-":
+        yield from _read_records(sys.stdin, file_format or "jsonl")
+    else:
+        yield from read_slots(path, file_format)
+
+# Function to resolve a completion event to a completions row (user_id, date, day, start_min,
+# end_min, activity, completed_at); raises ValueError saying why an event is rejected
+# An event names its slot with "day" and "time" (plus the "date" it happened, by default the
+# latest such weekday), or gives the moment "at" which the slot was active; "activity"
+# (default: the given activity) picks the slot when several are active
+def resolve_event(event, index, slots_by_time, activity="GATE study"):
+    if isinstance(event, ValueError):
+        raise event
+    if not isinstance(event, dict):
+        raise ValueError("an event must be a JSON object, not {}".format(type(event).__name__))
+    if not str(event.get("event_id") or "").strip():
+        raise ValueError("missing event_id")
+    user_id = event.get("user") or Timetable.DEFAULT_USER_ID
+
+    if event.get("time"):
+        completed_date = date.fromisoformat(event["date"]) if event.get("date") else None
+        day = event.get("day") or (completed_date and Timetable.WEEKDAYS[completed_date.weekday()])
+        if not day:
+            raise ValueError("an event with a time needs a day or a date")
+        slot = slots_by_time.get((day, event["time"]))
+        if slot is None:
+            raise ValueError("no slot {} {}".format(day, event["time"]))
+        completed_date = completed_date or Timetable.latest_date_for_day(day)
+        if Timetable.WEEKDAYS[completed_date.weekday()] != day:
+            raise ValueError("{} is not a {}".format(completed_date, day))
+        completed_at = datetime.fromisoformat(event["at"]) if event.get("at") else datetime.now()
+        completed_at = completed_at.isoformat(timespec="seconds")
+    elif event.get("at"):
+        at = datetime.fromisoformat(event["at"])
+        day = at.strftime("%A")
+        wanted = event.get("activity") or activity
+        slot = next((slot for slot in index.active(day, at.hour * 60 + at.minute) if wanted in slot["Activity"]), None)
+        if slot is None:
+            raise ValueError("no {} slot active at {}".format(wanted, event["at"]))
+        completed_date = at.date()
+        completed_at = at.isoformat(timespec="seconds")
+    else:
+        raise ValueError("an event needs either 'at' or 'time'")
+
+    start_min, end_min = Timetable.slot_minutes(slot)
+    return (user_id, completed_date.isoformat(), day, start_min, end_min, slot["Activity"], completed_at)
+
+# Function to apply completion events from a CSV/JSONL file or stdin ("-") in batched
+# transactions; each event id is applied once, however often it is fed in
+# Returns {"accepted", "rejected", "duplicate", "errors": [(line number, reason)]}
+def ingest_completions(path, file_format=None, batch_size=1000, activity="GATE study", progress=None):
+    Timetable.create_table()
+    create_event_table()
+    index = Timetable.get_timetable_index()
+    slots_by_time = {(day, slot["Time"]): slot for day, slots in index.slots.items() for slot in slots}
+    summary = {"accepted": 0, "rejected": 0, "duplicate": 0, "errors": []}
+    start = time.perf_counter()
+    events = 0
+
+    for chunk in chunked(read_events(path, file_format), batch_size):
+        resolved = {}
+        for line_number, event in chunk:
+            try:
+                row = resolve_event(event, index, slots_by_time, activity)
+            except (KeyError, TypeError, ValueError) as error:
+                summary["rejected"] += 1
+                summary["errors"].append((line_number, str(error)))
+                continue
+            event_id = str(event["event_id"]).strip()
+            if event_id in resolved:
+                summary["duplicate"] += 1
+            else:
+                resolved[event_id] = row
+
+        with Timetable.transaction() as conn:
+            known = set()
+            event_ids = list(resolved)
+            for ids in chunked(event_ids, 500):
+                known.update(row[0] for row in conn.execute(
+                    "SELECT event_id FROM completion_events WHERE event_id IN ({})".format(", ".join("?" * len(ids))), ids
+                ))
+            new = [(event_id, row) for event_id, row in resolved.items() if event_id not in known]
+            ingested_at = datetime.now().isoformat(timespec="seconds")
+            conn.executemany(
+                "INSERT INTO completion_events VALUES (?, ?, ?, ?, ?, ?, ?)",
+                ((event_id, row[0], row[1], row[3], row[4], row[5], ingested_at) for event_id, row in new),
+            )
+            # The same slot may already be marked (by hand or another event); that stays one completion
+            conn.executemany("INSERT OR IGNORE INTO completions VALUES (?, ?, ?, ?, ?, ?, ?)", (row for _, row in new))
+        summary["duplicate"] += len(known)
+        summary["accepted"] += len(new)
+
+        events += len(chunk)
+        if progress is not None:
+            progress(events, events / max(time.perf_counter() - start, 1e-9))
+
+    return summary
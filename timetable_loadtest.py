@@ -0,0 +1,103 @@
+import argparse
+import http.client
+import json
+import threading
+import time
+
+# Paths requested in turn by every client
+PATHS = ["/current", "/day/Monday", "/reward", "/current?at=2024-02-12T19:30"]
+
+# Function run by each client thread: keep-alive requests, optionally conditional, with latencies
+def client(host, port, requests, conditional, latencies, statuses):
+    conn = http.client.HTTPConnection(host, port)
+    etags = {}
+    for i in range(requests):
+        path = PATHS[i % len(PATHS)]
+        headers = {"If-None-Match": etags[path]} if conditional and path in etags else {}
+        start = time.perf_counter()
+        conn.request("GET", path, headers=headers)
+        response = conn.getresponse()
+        response.read()
+        latencies.append(time.perf_counter() - start)
+        statuses[response.status] = statuses.get(response.status, 0) + 1
+        if response.getheader("ETag"):
+            etags[path] = response.getheader("ETag")
+    conn.close()
+
+# Function to run the load test and print throughput and latency percentiles
+def load_test(host, port, clients, requests, conditional, writes):
+    latencies = []
+    statuses = {}
+    threads = [
+        threading.Thread(target=client, args=(host, port, requests, conditional, latencies, statuses))
+        for _ in range(clients)
+    ]
+
+    start = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    # A few completions while reading, to exercise cache invalidation
+    conn = http.client.HTTPConnection(host, port)
+    for _ in range(writes):
+        conn.request("POST", "/complete", json.dumps({"day": "Monday", "time": "7pm - 8:30pm"}),
+                     {"Content-Type": "application/json"})
+        conn.getresponse().read()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - start
+
+    latencies.sort()
+    print("{} clients x {} requests{}: {:,.0f} req/s".format(
+        clients, requests, " (conditional)" if conditional else "", len(latencies) / elapsed))
+    print("latency ms  p50 {:.2f}  p95 {:.2f}  p99 {:.2f}  max {:.2f}".format(
+        *(latencies[int(len(latencies) * q) - 1] * 1000 for q in (0.5, 0.95, 0.99, 1.0))))
+    print("status codes: {}".format(", ".join("{} x{}".format(code, n) for code, n in sorted(statuses.items()))))
+
+# Function to check that idle keep-alive clients cannot starve the server: idle_clients
+# (more than the server's workers) each make one request and then keep their connection
+# open, while one more client times a request; it is answered once the server closes idle
+# connections, so its latency is bounded by the server's idle timeout
+def idle_test(host, port, idle_clients, wait=30):
+    idle = [http.client.HTTPConnection(host, port, timeout=wait) for _ in range(idle_clients)]
+    # Each idle client connects and sends its request from a thread, as the ones beyond the
+    # worker count wait in the listen queue until a worker is free
+    threads = [threading.Thread(target=_request, args=(conn, "/day/Monday")) for conn in idle]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    conn = http.client.HTTPConnection(host, port, timeout=wait)
+    start = time.perf_counter()
+    try:
+        status = _request(conn, "/reward")
+    except OSError as error:
+        status = "failed ({})".format(error)
+    elapsed = time.perf_counter() - start
+    print("{} idle keep-alive clients: GET /reward -> {} after {:.2f} s".format(idle_clients, status, elapsed))
+    for conn in idle + [conn]:
+        conn.close()
+
+def _request(conn, path):
+    conn.request("GET", path)
+    response = conn.getresponse()
+    response.read()
+    return response.status
+
+
+if __name__ == "__main__":
+    arg_parser = argparse.ArgumentParser(description="Load test for timetable_server.py on localhost")
+    arg_parser.add_argument("--host", default="127.0.0.1")
+    arg_parser.add_argument("--port", type=int, default=8765)
+    arg_parser.add_argument("--clients", type=int, default=16)
+    arg_parser.add_argument("--requests", type=int, default=1000, help="requests per client")
+    arg_parser.add_argument("--conditional", action="store_true", help="send If-None-Match with known ETags")
+    arg_parser.add_argument("--writes", type=int, default=5, help="completions posted during the test")
+    arg_parser.add_argument("--idle", type=int, metavar="CLIENTS",
+                            help="instead, hold this many idle keep-alive connections (more than the server's "
+                                 "workers) and time one more request")
+    args = arg_parser.parse_args()
+    if args.idle:
+        idle_test(args.host, args.port, args.idle)
+    else:
+        load_test(args.host, args.port, args.clients, args.requests, args.conditional, args.writes)
@@ -0,0 +1,124 @@
+import atexit
+import functools
+import json
+import os
+import sqlite3
+import threading
+import time
+
+# Instrumentation is opt-in: TIMETABLE_METRICS=1 turns it on, and TIMETABLE_METRICS_FILE
+# (".json" for JSON, anything else for Prometheus text) is written when the process exits
+ENABLED = os.environ.get("TIMETABLE_METRICS", "") not in ("", "0")
+METRICS_FILE = os.environ.get("TIMETABLE_METRICS_FILE")
+
+# Upper bounds (seconds) of the latency histogram buckets
+BUCKETS = (0.0001, 0.0005, 0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1.0, 5.0, float("inf"))
+
+_lock = threading.Lock()
+_latencies = {}
+_rows = {}
+
+# Function to add one observation to a histogram series
+def observe(kind, name, seconds):
+    with _lock:
+        series = _latencies.get((kind, name))
+        if series is None:
+            series = _latencies[(kind, name)] = {"count": 0, "sum": 0.0, "buckets": [0] * len(BUCKETS)}
+        series["count"] += 1
+        series["sum"] += seconds
+        for i, bound in enumerate(BUCKETS):
+            if seconds <= bound:
+                series["buckets"][i] += 1
+                break
+
+# Decorator recording call counts and latency of a function; when metrics are off the
+# function is returned untouched, so there is nothing to pay
+def instrument(func):
+    if not ENABLED:
+        return func
+
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        start = time.perf_counter()
+        try:
+            return func(*args, **kwargs)
+        finally:
+            observe("function", func.__name__, time.perf_counter() - start)
+    return wrapper
+
+# Function to count rows scanned by a function (one call per scan, not per row)
+def count_rows(name, rows):
+    if ENABLED:
+        with _lock:
+            _rows[name] = _rows.get(name, 0) + rows
+
+# Connection that times every statement run through execute/executemany; only the
+# statement's execution is timed, rows fetched later through the cursor are not
+class InstrumentedConnection(sqlite3.Connection):
+    def execute(self, sql, *args):
+        start = time.perf_counter()
+        try:
+            return super().execute(sql, *args)
+        finally:
+            observe("statement", statement_name(sql), time.perf_counter() - start)
+
+    def executemany(self, sql, *args):
+        start = time.perf_counter()
+        try:
+            return super().executemany(sql, *args)
+        finally:
+            observe("statement", statement_name(sql), time.perf_counter() - start)
+
+# Connection class for sqlite3.connect(factory=...)
+connection_factory = InstrumentedConnection if ENABLED else sqlite3.Connection
+
+# Function to shorten a SQL statement into a metric label
+def statement_name(sql):
+    return " ".join(sql.split())[:80]
+
+# Function to return all metrics as a JSON-serialisable dict
+def snapshot():
+    with _lock:
+        return {
+            "latency": [
+                {"kind": kind, "name": name, "count": series["count"], "sum": series["sum"],
+                 "buckets": dict(zip(map(str, BUCKETS), series["buckets"]))}
+                for (kind, name), series in sorted(_latencies.items())
+            ],
+            "rows_scanned": dict(sorted(_rows.items())),
+        }
+
+# Function to render all metrics in the Prometheus text exposition format
+def prometheus_text():
+    lines = [
+        "# HELP timetable_latency_seconds Latency of Timetable functions and SQLite statements.",
+        "# TYPE timetable_latency_seconds histogram",
+    ]
+    with _lock:
+        for (kind, name), series in sorted(_latencies.items()):
+            labels = 'kind="{}",name="{}"'.format(kind, name.replace("\\", "\\\\").replace('"', '\\"'))
+            cumulative = 0
+            for bound, count in zip(BUCKETS, series["buckets"]):
+                cumulative += count
+                le = "+Inf" if bound == float("inf") else repr(bound)
+                lines.append('timetable_latency_seconds_bucket{{{},le="{}"}} {}'.format(labels, le, cumulative))
+            lines.append("timetable_latency_seconds_sum{{{}}} {}".format(labels, series["sum"]))
+            lines.append("timetable_latency_seconds_count{{{}}} {}".format(labels, series["count"]))
+
+        lines.append("# HELP timetable_rows_scanned_total Rows scanned by Timetable functions.")
+        lines.append("# TYPE timetable_rows_scanned_total counter")
+        for name, rows in sorted(_rows.items()):
+            lines.append('timetable_rows_scanned_total{{name="{}"}} {}'.format(name, rows))
+    return "\n".join(lines) + "\n"
+
+# Function to write the metrics to a file, as JSON for ".json" paths and Prometheus text otherwise
+def dump(path):
+    with open(path, "w") as f:
+        if path.endswith(".json"):
+            json.dump(snapshot(), f, indent=2)
+        else:
+            f.write(prometheus_text())
+
+
+if ENABLED and METRICS_FILE:
+    atexit.register(dump, METRICS_FILE)
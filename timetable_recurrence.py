@@ -0,0 +1,134 @@
+import argparse
+from collections import namedtuple
+from datetime import date, timedelta
+from functools import lru_cache
+
+import Timetable
+import timetable_templates
+
+# Occurrences are expanded and cached in windows of this many days
+WINDOW_DAYS = 28
+# Day the expansion windows are aligned to (a Monday)
+WINDOW_EPOCH = date(2024, 1, 1)
+
+# One dated occurrence (ISO date string) of a timetable slot or of a one-off slot
+Occurrence = namedtuple("Occurrence", ["date", "day", "time", "activity", "start_min", "end_min"])
+
+# Recurrence is stored in the template tables, so dated occurrences are exactly the dates
+# resolved by timetable_templates: rules live in slot_rules, cancelled occurrences and
+# holidays are overrides without an activity and one-off slots are overrides with one
+# Slots without a rule keep recurring every week, as the timetable always did
+def create_recurrence_tables():
+    timetable_templates.create_template_tables()
+
+# Function to attach a rule to a weekly slot: it only occurs between start_date and
+# end_date (either may be None) and, with interval_weeks > 1, every n-th week from start_date
+def set_rule(day, time, start_date=None, end_date=None, interval_weeks=1):
+    if interval_weeks < 1:
+        raise ValueError("interval_weeks must be at least 1")
+    if interval_weeks > 1 and start_date is None:
+        raise ValueError("a rule repeating every {} weeks needs a start_date".format(interval_weeks))
+    with Timetable.transaction() as conn:
+        conn.execute(
+            "INSERT OR REPLACE INTO slot_rules VALUES (?, ?, ?, ?, ?)",
+            (day, time, interval_weeks, _iso(start_date), _iso(end_date)),
+        )
+
+# Function to drop a slot's rule so it recurs every week again
+def remove_rule(day, time):
+    with Timetable.transaction() as conn:
+        conn.execute("DELETE FROM slot_rules WHERE day=? AND time=?", (day, time))
+
+# Function to cancel the occurrence of a slot on a date, or every slot of the date when time is None
+def add_exception(exception_date, time=None):
+    timetable_templates.set_override(exception_date, time)
+
+def remove_exception(exception_date, time=None):
+    timetable_templates.remove_override(exception_date, time)
+
+# Function to add a slot that only occurs on one date
+def add_one_off(one_off_date, time, activity):
+    timetable_templates.set_override(one_off_date, time, activity)
+
+def remove_one_off(one_off_date, time):
+    timetable_templates.remove_override(one_off_date, time)
+
+def _iso(value):
+    return None if value is None else date.fromisoformat(str(value)).isoformat()
+
+# Generator of the dated occurrences from start_date to end_date (inclusive), in date and
+# start order, optionally only those of one activity
+# Nothing is expanded up front: each window of WINDOW_DAYS is expanded when the generator
+# reaches it and cached until the database changes, so a query costs about its result size
+def occurrences(start_date, end_date, activity=None):
+    start_date = date.fromisoformat(str(start_date))
+    end_date = date.fromisoformat(str(end_date))
+    first, last = start_date.isoformat(), end_date.isoformat()
+    window = WINDOW_EPOCH + timedelta(days=(start_date - WINDOW_EPOCH).days // WINDOW_DAYS * WINDOW_DAYS)
+    while window <= end_date:
+        for occurrence in _expand_window(window, activity, Timetable.database_version()):
+            if occurrence.date > last:
+                return
+            if occurrence.date >= first:
+                yield occurrence
+        window += timedelta(days=WINDOW_DAYS)
+
+# Function to list the occurrences of one date
+def occurrences_on(occurrence_date, activity=None):
+    return list(occurrences(occurrence_date, occurrence_date, activity))
+
+# Function to expand one window into its occurrences (only those of the activity if given),
+# skipping slots whose time does not parse
+@lru_cache(maxsize=256)
+def _expand_window(window, activity, version):
+    result = []
+    for offset in range(WINDOW_DAYS):
+        for slot in timetable_templates.resolve_date(window + timedelta(days=offset)):
+            if slot["Start Min"] is None or (activity is not None and slot["Activity"] != activity):
+                continue
+            result.append(Occurrence(slot["Date"], slot["Day"], slot["Time"], slot["Activity"],
+                                     slot["Start Min"], slot["End Min"]))
+    return result
+
+if __name__ == "__main__":
+    arg_parser = argparse.ArgumentParser(description="Dated occurrences of the timetable slots")
+    arg_parser.add_argument("--db", default=Timetable.DB_PATH)
+    subparsers = arg_parser.add_subparsers(dest="command", required=True)
+
+    list_parser = subparsers.add_parser("list", help="list the occurrences in a date range")
+    list_parser.add_argument("--from", dest="start", help="first date (default: today)")
+    list_parser.add_argument("--days", type=int, default=7, help="number of days (default: %(default)s)")
+    list_parser.add_argument("--activity")
+
+    rule_parser = subparsers.add_parser("rule", help="bound a weekly slot or make it repeat every n weeks")
+    rule_parser.add_argument("day", choices=Timetable.WEEKDAYS)
+    rule_parser.add_argument("time")
+    rule_parser.add_argument("--from", dest="start")
+    rule_parser.add_argument("--until", dest="end")
+    rule_parser.add_argument("--every", type=int, default=1, metavar="WEEKS")
+
+    skip_parser = subparsers.add_parser("skip", help="cancel one slot on a date, or the whole date")
+    skip_parser.add_argument("date")
+    skip_parser.add_argument("time", nargs="?")
+
+    once_parser = subparsers.add_parser("once", help="add a slot on a single date")
+    once_parser.add_argument("date")
+    once_parser.add_argument("time")
+    once_parser.add_argument("activity")
+    args = arg_parser.parse_args()
+
+    Timetable.configure_database(args.db)
+    Timetable.create_table()
+    create_recurrence_tables()
+    if args.command == "list":
+        start_date = date.fromisoformat(args.start) if args.start else date.today()
+        end_date = start_date + timedelta(days=args.days - 1)
+        for occurrence in occurrences(start_date, end_date, args.activity):
+            print("{} {:<9} {:<16} {}".format(occurrence.date, occurrence.day, occurrence.time, occurrence.activity))
+    elif args.command == "rule":
+        set_rule(args.day, args.time, args.start, args.end, args.every)
+    elif args.command == "skip":
+        add_exception(args.date, args.time)
+    else:
+        add_one_off(args.date, args.time, args.activity)
+    Timetable.close_connections()
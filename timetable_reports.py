@@ -0,0 +1,122 @@
+import argparse
+from datetime import date, timedelta
+
+import Timetable
+
+# Period key expressions for grouping dates in the adherence report
+PERIOD_KEYS = {
+    "day": "{row}.date",
+    "week": dict(Timetable.REWARD_TOTAL_PERIODS)["week"],
+    "month": "strftime('%Y-%m', {row}.date)",
+}
+
+# CTE expanding the timetable into the planned occurrences of one activity for every date
+# in [:start, :end]; the timetable's weekday names are matched with strftime('%w')
+PLANNED_CTE = """
+    WITH RECURSIVE dates(date) AS (
+        SELECT :start UNION ALL SELECT date(date, '+1 day') FROM dates WHERE date < :end
+    ),
+    weekdays(number, name) AS (
+        VALUES (0, 'Sunday'), (1, 'Monday'), (2, 'Tuesday'), (3, 'Wednesday'),
+               (4, 'Thursday'), (5, 'Friday'), (6, 'Saturday')
+    ),
+    planned AS (
+        SELECT dates.date, t.day, t.time, t.start_min, t.end_min
+        FROM dates
+        JOIN weekdays ON weekdays.number = CAST(strftime('%w', dates.date) AS INTEGER)
+        JOIN timetable t ON t.day = weekdays.name
+        WHERE t.activity = :activity AND t.end_min IS NOT NULL
+    )
+"""
+
+# Function to fill in the default date range (the last 28 days) and query parameters
+def _params(start_date, end_date, user_id, activity):
+    end_date = date.fromisoformat(str(end_date)) if end_date else date.today()
+    start_date = date.fromisoformat(str(start_date)) if start_date else end_date - timedelta(days=27)
+    return {"start": start_date.isoformat(), "end": end_date.isoformat(), "user": user_id, "activity": activity}
+
+# Function to report planned vs completed hours of an activity per day, week or month
+# Returns a list of (period, planned hours, completed hours, adherence ratio)
+def adherence(start_date=None, end_date=None, period="week", user_id=Timetable.DEFAULT_USER_ID,
+              activity="GATE study"):
+    if period not in PERIOD_KEYS:
+        raise ValueError("period must be one of: {}".format(", ".join(PERIOD_KEYS)))
+
+    query = PLANNED_CTE + """,
+        planned_totals AS (
+            SELECT {planned_key} AS period, SUM(end_min - start_min) AS minutes FROM planned GROUP BY 1
+        ),
+        completed_totals AS (
+            SELECT {completed_key} AS period, SUM(end_min - start_min) AS minutes
+            FROM completions
+            WHERE activity = :activity AND date BETWEEN :start AND :end AND user_id = :user
+              AND end_min IS NOT NULL
+            GROUP BY 1
+        )
+        SELECT p.period, p.minutes / 60.0, COALESCE(c.minutes, 0) / 60.0,
+               ROUND(COALESCE(c.minutes, 0) * 1.0 / p.minutes, 3)
+        FROM planned_totals p LEFT JOIN completed_totals c ON c.period = p.period
+        ORDER BY p.period
+    """.format(
+        planned_key=PERIOD_KEYS[period].format(row="planned"),
+        completed_key=PERIOD_KEYS[period].format(row="completions"),
+    )
+    return Timetable.get_connection().execute(query, _params(start_date, end_date, user_id, activity)).fetchall()
+
+# Function to find runs of consecutive days with at least one completion of the activity,
+# using the gaps-and-islands window trick; returns (first date, last date, days), longest first
+def streaks(start_date=None, end_date=None, user_id=Timetable.DEFAULT_USER_ID, activity="GATE study"):
+    query = """
+        WITH days AS (
+            SELECT DISTINCT date FROM completions
+            WHERE activity = :activity AND date BETWEEN :start AND :end AND user_id = :user
+        ),
+        islands AS (
+            SELECT date, julianday(date) - ROW_NUMBER() OVER (ORDER BY date) AS island FROM days
+        )
+        SELECT MIN(date), MAX(date), COUNT(*) FROM islands GROUP BY island ORDER BY 3 DESC, 1 DESC
+    """
+    return Timetable.get_connection().execute(query, _params(start_date, end_date, user_id, activity)).fetchall()
+
+# Function to rank the planned slots of the activity by how often they were not completed
+# Returns (rank, day, time, missed, planned) for the top 'limit' slots
+def most_missed(start_date=None, end_date=None, user_id=Timetable.DEFAULT_USER_ID, activity="GATE study",
+                limit=5):
+    query = PLANNED_CTE + """
+        SELECT * FROM (
+            SELECT RANK() OVER (ORDER BY SUM(c.date IS NULL) DESC) AS rank,
+                   p.day, p.time, SUM(c.date IS NULL) AS missed, COUNT(*) AS planned
+            FROM planned p
+            LEFT JOIN completions c
+              ON c.user_id = :user AND c.date = p.date AND c.start_min = p.start_min
+             AND c.end_min = p.end_min AND c.activity = :activity
+            GROUP BY p.day, p.time
+        )
+        WHERE missed > 0 ORDER BY rank, day, time LIMIT :limit
+    """
+    params = dict(_params(start_date, end_date, user_id, activity), limit=limit)
+    return Timetable.get_connection().execute(query, params).fetchall()
+
+
+if __name__ == "__main__":
+    arg_parser = argparse.ArgumentParser(description="Adherence reports for the timetable database")
+    arg_parser.add_argument("report", choices=["adherence", "streaks", "missed"])
+    arg_parser.add_argument("--db", default=Timetable.DB_PATH)
+    arg_parser.add_argument("--from", dest="start", help="first date (default: 28 days ago)")
+    arg_parser.add_argument("--to", dest="end", help="last date (default: today)")
+    arg_parser.add_argument("--user", default=Timetable.DEFAULT_USER_ID)
+    arg_parser.add_argument("--activity", default="GATE study")
+    arg_parser.add_argument("--period", choices=sorted(PERIOD_KEYS), default="week")
+    args = arg_parser.parse_args()
+
+    Timetable.configure_database(args.db)
+    Timetable.create_table()
+    if args.report == "adherence":
+        for period, planned, completed, ratio in adherence(args.start, args.end, args.period, args.user, args.activity):
+            print("{}  planned {:6.1f} h  completed {:6.1f} h  {:5.1%}".format(period, planned, completed, ratio))
+    elif args.report == "streaks":
+        for first, last, days in streaks(args.start, args.end, args.user, args.activity):
+            print("{} .. {}  {} days".format(first, last, days))
+    else:
+        for rank, day, time, missed, planned in most_missed(args.start, args.end, args.user, args.activity):
+            print("{}. {} {}  missed {} of {}".format(rank, day, time, missed, planned))
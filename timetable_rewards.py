@@ -0,0 +1,124 @@
+import Timetable
+
+try:
+    import numpy as np
+except ImportError:  # numpy is optional; the pure Python path gives the same results
+    np = None
+
+# Columns that calculate_rewards can group by
+GROUP_COLUMNS = ("user", "week", "activity")
+
+# Function to turn timetable rows (Slot records, slot dicts or a SlotTable) into columnar lists
+def reward_columns(timetable_data, user="default", week=""):
+    columns = {"start_min": [], "end_min": [], "completed": [], "activity": [], "user": [], "week": []}
+    for slot in timetable_data:
+        start_min, end_min = Timetable.slot_minutes(slot)
+        columns["start_min"].append(start_min or 0)
+        # Open-ended slots (e.g. "11pm") have no duration to reward
+        columns["end_min"].append(end_min if end_min is not None else start_min or 0)
+        columns["completed"].append(slot["Time Duration"] == "completed")
+        columns["activity"].append(slot["Activity"])
+        columns["user"].append(user)
+        columns["week"].append(week)
+    return columns
+
+# Function to load the completion log between two dates as columnar lists
+def completion_columns(start_date=None, end_date=None, user_id=None):
+    columns = {"start_min": [], "end_min": [], "completed": [], "activity": [], "user": [], "week": []}
+    for user, completed_date, _, start_min, end_min, activity, _ in Timetable.get_completions(start_date, end_date, user_id):
+        columns["start_min"].append(start_min)
+        columns["end_min"].append(end_min if end_min is not None else start_min)
+        columns["completed"].append(True)
+        columns["activity"].append(activity)
+        columns["user"].append(user)
+        columns["week"].append(Timetable.iso_week(completed_date))
+    return columns
+
+# Function to sum completed minutes per combination of the key columns
+def _sum_minutes(columns, keys):
+    if np is None:
+        totals = {}
+        for i, completed in enumerate(columns["completed"]):
+            if completed:
+                key = tuple(columns[name][i] for name in keys)
+                totals[key] = totals.get(key, 0) + columns["end_min"][i] - columns["start_min"][i]
+        return totals
+
+    completed = np.asarray(columns["completed"], dtype=bool)
+    durations = (np.asarray(columns["end_min"], dtype=np.int64) - np.asarray(columns["start_min"], dtype=np.int64))[completed]
+    if not keys:
+        return {(): int(durations.sum())} if len(durations) else {}
+
+    # Factorise each key column and combine the codes into one mixed-radix group code
+    codes = np.zeros(len(durations), dtype=np.int64)
+    uniques = []
+    for name in keys:
+        values, inverse = np.unique(np.asarray(columns[name])[completed], return_inverse=True)
+        codes = codes * len(values) + inverse
+        uniques.append(values)
+
+    sums = np.bincount(codes, weights=durations)
+    totals = {}
+    for code in np.flatnonzero(np.bincount(codes)):
+        key = []
+        remainder = int(code)
+        for values in reversed(uniques):
+            remainder, i = divmod(remainder, len(values))
+            key.append(values[i].item())
+        totals[tuple(reversed(key))] = int(sums[code])
+    return totals
+
+# Function to turn per-key minutes into rewards, applying per-activity rates when
+# reward_per_hour is a dict ({"GATE study": 10, "default": 0})
+def _minutes_to_rewards(minutes, keys, group_by, reward_per_hour):
+    totals = {}
+    for key, total_minutes in minutes.items():
+        if isinstance(reward_per_hour, dict):
+            activity = key[keys.index("activity")]
+            rate = reward_per_hour.get(activity, reward_per_hour.get("default", 0))
+        else:
+            rate = reward_per_hour
+        group = key[:len(group_by)]
+        totals[group] = totals.get(group, 0) + total_minutes / 60 * rate
+
+    if not group_by:
+        return totals.get((), 0.0)
+    if len(group_by) == 1:
+        return {group[0]: reward for group, reward in totals.items()}
+    return totals
+
+# Function to check the grouping columns and add "activity" when rates are per activity
+def _reward_keys(group_by, reward_per_hour):
+    if isinstance(group_by, str):
+        group_by = (group_by,)
+    group_by = tuple(group_by or ())
+    for name in group_by:
+        if name not in GROUP_COLUMNS:
+            raise ValueError("group_by must only contain: {}".format(", ".join(GROUP_COLUMNS)))
+    if isinstance(reward_per_hour, dict) and "activity" not in group_by:
+        return group_by, group_by + ("activity",)
+    return group_by, group_by
+
+# Function to calculate the reward over columnar data, optionally grouped by
+# user, week and/or activity; ungrouped it matches calculate_reward_to_transfer
+def calculate_rewards(columns, reward_per_hour=10, group_by=()):
+    group_by, keys = _reward_keys(group_by, reward_per_hour)
+    return _minutes_to_rewards(_sum_minutes(columns, keys), keys, group_by, reward_per_hour)
+
+# SQL expression for each grouping column of the completions table
+SQL_GROUP_COLUMNS = {"user": "user_id", "week": "iso_week(date)", "activity": "activity"}
+
+# Function to calculate the same rewards with a SQL SUM over the completion log
+def calculate_rewards_sql(reward_per_hour=10, group_by=(), start_date=None, end_date=None, user_id=None):
+    group_by, keys = _reward_keys(group_by, reward_per_hour)
+    columns = [SQL_GROUP_COLUMNS[name] for name in keys]
+
+    # Open-ended slots count with zero minutes, as in reward_columns
+    select = ", ".join(columns + ["SUM(COALESCE(end_min, start_min) - start_min)"])
+    where, params = Timetable.completion_filters(start_date, end_date, user_id)
+    query = "SELECT {} FROM completions".format(select) + where
+    if columns:
+        query += " GROUP BY " + ", ".join(columns)
+
+    minutes = {tuple(row[:-1]): row[-1] for row in Timetable.get_connection().execute(query, params)}
+    return _minutes_to_rewards(minutes, keys, group_by, reward_per_hour)
@@ -0,0 +1,145 @@
+import asyncio
+import heapq
+import inspect
+import itertools
+import sys
+import traceback
+from datetime import datetime, timedelta
+
+import Timetable
+
+EVENTS = ("start", "end", "reminder")
+
+# Clock backed by the real time of day
+class SystemClock:
+    def now(self):
+        return datetime.now()
+
+    async def sleep_until(self, when):
+        await asyncio.sleep(max((when - self.now()).total_seconds(), 0))
+
+# Clock for tests and simulations: sleeping jumps straight to the requested time,
+# so a whole week of slot boundaries runs in milliseconds
+class SimulatedClock:
+    def __init__(self, start):
+        self.current = start
+
+    def now(self):
+        return self.current
+
+    async def sleep_until(self, when):
+        if when > self.current:
+            self.current = when
+        await asyncio.sleep(0)
+
+# Function to get the first weekly occurrence of a minute of the given weekday
+# at or after the given moment
+def next_occurrence(day, minute, after):
+    days_ahead = (Timetable.WEEKDAYS.index(day) - after.weekday()) % 7
+    midnight = datetime.combine(after.date(), datetime.min.time())
+    when = midnight + timedelta(days=days_ahead, minutes=minute)
+    if when < after:
+        when += timedelta(days=7)
+    return when
+
+# Long-running scheduler that keeps a heap of the upcoming slot boundaries, sleeps until
+# the earliest one and fires the callbacks registered for it; nothing is polled
+class SlotScheduler:
+    def __init__(self, timetable_index, clock=None):
+        self.index = timetable_index
+        self.clock = clock or SystemClock()
+        self.registrations = []
+        self.heap = []
+        self._sequence = itertools.count()
+        self._wakeup = asyncio.Event()
+        self._running = False
+
+    # Register callback(event, slot, when) for "start", "end" or "reminder" of the slots
+    # whose activity contains the given text (all slots when activity is None)
+    def add_callback(self, event, callback, activity=None, minutes_before=0):
+        if event not in EVENTS:
+            raise ValueError("event must be one of: {}".format(", ".join(EVENTS)))
+        registration = (event, callback, activity, minutes_before)
+        self.registrations.append(registration)
+        self._schedule(registration, self.clock.now())
+        self._wakeup.set()
+
+    def on_start(self, callback, activity=None):
+        self.add_callback("start", callback, activity)
+
+    def on_end(self, callback, activity=None):
+        self.add_callback("end", callback, activity)
+
+    def on_reminder(self, minutes_before, callback, activity=None):
+        self.add_callback("reminder", callback, activity, minutes_before)
+
+    # Swap in a new timetable (e.g. after an import) and rebuild the heap from it
+    def reload(self, timetable_index):
+        self.index = timetable_index
+        self.heap = []
+        now = self.clock.now()
+        for registration in self.registrations:
+            self._schedule(registration, now)
+        self._wakeup.set()
+
+    def stop(self):
+        self._running = False
+        self._wakeup.set()
+
+    # Function to push the next occurrence of a registration for every matching slot
+    def _schedule(self, registration, after):
+        event, _, activity, minutes_before = registration
+        for day, slots in self.index.slots.items():
+            for slot, start_min, end_min in zip(slots, self.index.starts[day], self.index.ends[day]):
+                if activity is None or activity in slot["Activity"]:
+                    minute = end_min if event == "end" else start_min - minutes_before
+                    when = next_occurrence(day, minute, after)
+                    heapq.heappush(self.heap, (when, next(self._sequence), registration, day, minute, slot))
+
+    # Run until stop() is called, or until the next boundary is later than 'until'
+    async def run(self, until=None):
+        self._running = True
+        while self._running and self.heap:
+            when = self.heap[0][0]
+            if until is not None and when > until:
+                break
+
+            # Sleep until the boundary, waking early if callbacks or the timetable change
+            self._wakeup.clear()
+            sleeper = asyncio.ensure_future(self.clock.sleep_until(when))
+            waker = asyncio.ensure_future(self._wakeup.wait())
+            await asyncio.wait({sleeper, waker}, return_when=asyncio.FIRST_COMPLETED)
+            for task in (sleeper, waker):
+                task.cancel()
+
+            now = self.clock.now()
+            while self.heap and self.heap[0][0] <= now:
+                when, _, registration, day, minute, slot = heapq.heappop(self.heap)
+                event, callback, _, _ = registration
+                heapq.heappush(self.heap, (when + timedelta(days=7), next(self._sequence), registration, day, minute, slot))
+
+                # A failing callback is reported and the scheduler carries on with the rest
+                try:
+                    result = callback(event, slot, when)
+                    if inspect.isawaitable(result):
+                        await result
+                except Exception:
+                    print("{} callback for {} ({}) failed:".format(event, slot["Activity"], slot["Time"]), file=sys.stderr)
+                    traceback.print_exc()
+        self._running = False
+
+
+if __name__ == "__main__":
+    # Print GATE study reminders, starts and ends from the timetable database as they happen
+    def announce(event, slot, when):
+        print("{:%a %H:%M} {} {} ({})".format(when, event, slot["Activity"], slot["Time"]), flush=True)
+
+    Timetable.create_table()
+    scheduler = SlotScheduler(Timetable.get_timetable_index())
+    scheduler.on_reminder(10, announce, "GATE study")
+    scheduler.on_start(announce, "GATE study")
+    scheduler.on_end(announce, "GATE study")
+    try:
+        asyncio.run(scheduler.run())
+    except KeyboardInterrupt:
+        pass
@@ -0,0 +1,236 @@
+import argparse
+import json
+import sqlite3
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, datetime
+from email.utils import formatdate, parsedate_to_datetime
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlsplit
+
+import Timetable
+import timetable_metrics
+
+# Seconds a keep-alive connection may sit idle before it is closed; each open connection
+# holds one worker of the pool, so idle clients must not keep them forever
+IDLE_TIMEOUT = 5
+
+# Counter that goes up whenever the database changes, whoever changed it; it is read from
+# a connection of its own, whose PRAGMA data_version moves on every commit made elsewhere
+class ChangeCounter:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.conn = sqlite3.connect(Timetable.DB_PATH, check_same_thread=False)
+        self.data_version = None
+        self.counter = 0
+        self.modified = time.time()
+        self.boot = int(self.modified)
+        self.index = None
+        self.index_counter = None
+
+    # Function to return (ETag, Last-Modified timestamp), bumping them if the database changed
+    def current(self):
+        with self.lock:
+            data_version = self.conn.execute("PRAGMA data_version").fetchone()[0]
+            if data_version != self.data_version:
+                if self.data_version is not None:
+                    self.counter += 1
+                    self.modified = time.time()
+                self.data_version = data_version
+            return '"{}-{}"'.format(self.boot, self.counter), int(self.modified)
+
+    # Function to return the warm TimetableIndex shared by all requests, rebuilt after changes
+    def timetable_index(self):
+        self.current()
+        with self.lock:
+            if self.index_counter != self.counter:
+                rows = self.conn.execute("SELECT * FROM timetable")
+                self.index = Timetable.TimetableIndex(Timetable.convert_to_dict(rows))
+                self.index_counter = self.counter
+            return self.index
+
+# Function to turn an index slot into the JSON shape returned by the endpoints
+def slot_json(slot):
+    return {"day": slot["Day"], "time": slot["Time"], "activity": slot["Activity"],
+            "start_min": slot["Start Min"], "end_min": slot["End Min"]}
+
+# Handler for the read endpoints (cached per change counter) and POST /complete
+class TimetableHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    server_version = "Timetable"
+    # Headers and body are written separately; without this keep-alive clients wait on delayed ACKs
+    disable_nagle_algorithm = True
+
+    def setup(self):
+        self.timeout = self.server.idle_timeout
+        super().setup()
+
+    # GET /current?at=2024-02-12T19:30  -> slots active now (or at the given time)
+    def get_current(self, query):
+        now = datetime.fromisoformat(query["at"])
+        slots = self.server.changes.timetable_index().active(now.strftime("%A"), now.hour * 60 + now.minute)
+        return {"at": now.isoformat(timespec="minutes"), "slots": [slot_json(slot) for slot in slots]}
+
+    # GET /day/Monday  -> the slots of a weekday in start order
+    def get_day(self, query, day):
+        if day not in Timetable.WEEKDAYS:
+            raise LookupError("unknown day {!r}".format(day))
+        return {"day": day, "slots": [slot_json(slot) for slot in self.server.changes.timetable_index().slots.get(day, [])]}
+
+    # GET /reward?user=default&period=week&key=2024-W07&rate=10
+    def get_reward(self, query):
+        reward = Timetable.get_reward_to_transfer(
+            query.get("user", Timetable.DEFAULT_USER_ID),
+            query.get("period", "all"),
+            query.get("key", ""),
+            float(query.get("rate", 10)),
+        )
+        return {"user": query.get("user", Timetable.DEFAULT_USER_ID), "reward": reward}
+
+    def do_GET(self):
+        url = urlsplit(self.path)
+        query = {name: values[-1] for name, values in parse_qs(url.query).items()}
+        parts = url.path.strip("/").split("/")
+        if parts == ["metrics"]:
+            return self.send_metrics()
+        etag, modified = self.server.changes.current()
+        if parts == ["current"] and "at" not in query:
+            # The current slot also changes with the clock, so the minute is part of the version
+            now = datetime.now()
+            query["at"] = now.strftime("%Y-%m-%dT%H:%M")
+            etag = etag[:-1] + "-" + now.strftime("%Y%m%d%H%M") + '"'
+            modified = max(modified, int(now.replace(second=0, microsecond=0).timestamp()))
+
+        if self.headers.get("If-None-Match") == etag:
+            return self.send_json(304, None, etag, modified)
+        since = self.headers.get("If-Modified-Since")
+        if since and "If-None-Match" not in self.headers:
+            try:
+                if parsedate_to_datetime(since).timestamp() >= modified:
+                    return self.send_json(304, None, etag, modified)
+            except (TypeError, ValueError):
+                pass
+
+        # Rendered bodies are reused until the database changes
+        cache_key = (etag, self.path)
+        body = self.server.cache.get(cache_key)
+        if body is None:
+            try:
+                if parts == ["current"]:
+                    result = self.get_current(query)
+                elif len(parts) == 2 and parts[0] == "day":
+                    result = self.get_day(query, parts[1])
+                elif parts == ["reward"]:
+                    result = self.get_reward(query)
+                else:
+                    return self.send_json(404, {"error": "not found"})
+            except LookupError as error:
+                return self.send_json(404, {"error": str(error)})
+            except ValueError as error:
+                return self.send_json(400, {"error": str(error)})
+            body = json.dumps(result).encode()
+            self.server.cache_put(cache_key, body)
+        self.send_json(200, body, etag, modified)
+
+    # POST /complete  {"day": "Monday", "time": "7pm - 8:30pm", "user": "default", "date": "2024-02-12"}
+    def do_POST(self):
+        if urlsplit(self.path).path != "/complete":
+            return self.send_json(404, {"error": "not found"})
+        try:
+            length = int(self.headers.get("Content-Length", 0))
+            request = json.loads(self.rfile.read(length) or b"{}")
+            if not isinstance(request, dict):
+                raise ValueError("the body must be a JSON object")
+            completed_date = date.fromisoformat(request["date"]) if request.get("date") else None
+            Timetable.mark_gate_study_completion(
+                request["day"], request["time"], request.get("user", Timetable.DEFAULT_USER_ID), completed_date
+            )
+        except (KeyError, TypeError, ValueError) as error:
+            return self.send_json(400, {"error": "bad request: {}".format(error)})
+        except LookupError as error:
+            return self.send_json(404, {"error": str(error)})
+        self.send_json(200, {"ok": True})
+
+    # GET /metrics  -> Prometheus text (empty unless TIMETABLE_METRICS is set)
+    def send_metrics(self):
+        body = timetable_metrics.prometheus_text().encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; version=0.0.4")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    # Function to send a JSON body (bytes, or an object to encode) with the caching headers
+    def send_json(self, status, body, etag=None, modified=None):
+        if body is not None and not isinstance(body, bytes):
+            body = json.dumps(body).encode()
+        self.send_response(status)
+        if etag is not None:
+            self.send_header("ETag", etag)
+            self.send_header("Last-Modified", formatdate(modified, usegmt=True))
+            self.send_header("Cache-Control", "no-cache")
+        if body is not None:
+            self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body or b"")))
+        self.end_headers()
+        if body is not None:
+            self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        if self.server.verbose:
+            super().log_message(format, *args)
+
+# HTTP server holding the change counter and the rendered response cache; connections are
+# handled by a fixed pool of threads so each keeps its pooled database connection warm
+class TimetableServer(ThreadingHTTPServer):
+    cache_size = 4096
+
+    def __init__(self, address, verbose=False, workers=32, idle_timeout=IDLE_TIMEOUT):
+        super().__init__(address, TimetableHandler)
+        self.idle_timeout = idle_timeout
+        self.changes = ChangeCounter()
+        self.cache = {}
+        self.cache_lock = threading.Lock()
+        self.verbose = verbose
+        self.pool = ThreadPoolExecutor(workers, thread_name_prefix="timetable-http")
+
+    def process_request(self, request, client_address):
+        self.pool.submit(self.process_request_thread, request, client_address)
+
+    def server_close(self):
+        super().server_close()
+        self.pool.shutdown(wait=False, cancel_futures=True)
+
+    # Function to store a rendered body, dropping entries from older versions when full
+    def cache_put(self, key, body):
+        with self.cache_lock:
+            if len(self.cache) >= self.cache_size:
+                self.cache = {k: v for k, v in self.cache.items() if k[0] == key[0]}
+                if len(self.cache) >= self.cache_size:
+                    self.cache.clear()
+            self.cache[key] = body
+
+
+if __name__ == "__main__":
+    arg_parser = argparse.ArgumentParser(description="Local HTTP service for timetable queries")
+    arg_parser.add_argument("--db", default=Timetable.DB_PATH)
+    arg_parser.add_argument("--host", default="127.0.0.1")
+    arg_parser.add_argument("--port", type=int, default=8765)
+    arg_parser.add_argument("--workers", type=int, default=32, help="request handler threads")
+    arg_parser.add_argument("--idle-timeout", type=float, default=IDLE_TIMEOUT,
+                            help="seconds before an idle keep-alive connection is closed (default: %(default)s)")
+    arg_parser.add_argument("--verbose", action="store_true", help="log every request")
+    args = arg_parser.parse_args()
+
+    Timetable.configure_database(args.db)
+    Timetable.create_table()
+    server = TimetableServer((args.host, args.port), args.verbose, args.workers, args.idle_timeout)
+    print("Serving timetable on http://{}:{}".format(args.host, args.port))
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        Timetable.close_connections()
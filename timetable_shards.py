@@ -0,0 +1,216 @@
+import argparse
+import os
+import re
+import sqlite3
+import threading
+import weakref
+import zlib
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import contextmanager
+
+import Timetable
+import timetable_rewards
+
+# Directory the shard databases are kept in
+SHARD_DIR = "timetable_shards"
+
+# Maps user ids to shard databases: one file per user, or with buckets=N one of N files
+# chosen by a CRC32 of the user id (stable across processes, unlike hash())
+# The router keeps its own connection per shard and per thread; Timetable's functions run
+# against a shard inside use(), which never touches Timetable.DB_PATH
+# A new shard gets a copy of the timetable of timetable_path (default: Timetable.DB_PATH),
+# so completions can be marked in it straight away
+class ShardRouter:
+    def __init__(self, directory=SHARD_DIR, buckets=None, timetable_path=None):
+        self.directory = directory
+        self.buckets = buckets
+        self.timetable_path = timetable_path
+        self._local = threading.local()
+        self._ready = set()
+        self._ready_lock = threading.Lock()
+
+    def shard_name(self, user_id):
+        checksum = zlib.crc32(str(user_id).encode())
+        if self.buckets:
+            return "bucket-{:04d}.db".format(checksum % self.buckets)
+        # The checksum keeps ids that only differ in replaced characters apart
+        return "user-{}-{:08x}.db".format(re.sub(r"[^A-Za-z0-9_.-]", "_", str(user_id))[:64], checksum)
+
+    def path_for(self, user_id):
+        return os.path.join(self.directory, self.shard_name(user_id))
+
+    # Function to return the paths of the shard databases that exist on disk
+    def paths(self):
+        if not os.path.isdir(self.directory):
+            return []
+        return sorted(
+            os.path.join(self.directory, name) for name in os.listdir(self.directory) if name.endswith(".db")
+        )
+
+    # Function to group user ids by the shard they live in
+    def group(self, user_ids):
+        shards = {}
+        for user_id in user_ids:
+            shards.setdefault(self.path_for(user_id), []).append(user_id)
+        return shards
+
+    # Function to return this thread's connection to a shard, creating the shard's tables
+    # (and copying the timetable into an empty one) the first time the router opens it
+    def connect(self, path):
+        shards = getattr(self._local, "shards", None)
+        if shards is None:
+            shards = self._local.shards = _ShardConnections()
+        conn = shards.connections.get(path)
+        if conn is None:
+            os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+            conn = shards.connections[path] = Timetable._open_connection(path)
+            with self._ready_lock:
+                ready = path in self._ready
+            if not ready:
+                with Timetable.use_connection(conn):
+                    Timetable.create_table()
+                self._copy_timetable(conn)
+                with self._ready_lock:
+                    self._ready.add(path)
+        return conn
+
+    # Function to fill an empty shard timetable from the timetable database
+    def _copy_timetable(self, conn):
+        source_path = self.timetable_path or Timetable.DB_PATH
+        if not os.path.exists(source_path) or conn.execute("SELECT EXISTS (SELECT 1 FROM timetable)").fetchone()[0]:
+            return
+        conn.execute("ATTACH DATABASE ? AS source", (source_path,))
+        try:
+            if conn.execute("SELECT 1 FROM source.sqlite_master WHERE type='table' AND name='timetable'").fetchone():
+                with conn:
+                    conn.execute(
+                        "INSERT OR IGNORE INTO timetable (day, time, activity, time_duration, start_min, end_min) "
+                        "SELECT day, time, activity, time_duration, start_min, end_min FROM source.timetable"
+                    )
+        finally:
+            conn.execute("DETACH DATABASE source")
+
+    # Context manager running the block with Timetable pointed at the user's shard
+    @contextmanager
+    def use(self, user_id):
+        with Timetable.use_connection(self.connect(self.path_for(user_id))) as conn:
+            yield conn
+
+    # Function to close this thread's shard connections (other threads close theirs on exit)
+    def close(self):
+        shards = getattr(self._local, "shards", None)
+        if shards is not None:
+            shards.close()
+            self._local.shards = None
+
+# A thread's shard connections, closed by the finalizer when the thread ends
+class _ShardConnections:
+    def __init__(self):
+        self.connections = {}
+        self.close = weakref.finalize(self, _close_all, self.connections)
+
+def _close_all(connections):
+    for conn in connections.values():
+        conn.close()
+    connections.clear()
+
+# Function to mark a completion in the shard of the given user; raises LookupError when
+# the shard's timetable has no such slot
+def mark_completion(router, user_id, day, time, completed_date=None):
+    with router.use(user_id):
+        Timetable.mark_gate_study_completion(day, time, user_id, completed_date)
+
+# Function to read a user's maintained reward total from their shard
+def get_reward(router, user_id, period="all", period_key="", reward_per_hour=10):
+    with router.use(user_id):
+        return Timetable.get_reward_to_transfer(user_id, period, period_key, reward_per_hour)
+
+# Function to copy the timetable and each user's completions from one database into
+# the shards; returns {shard path: number of users moved there}
+def split_database(router, source_path):
+    source = sqlite3.connect(source_path)
+    try:
+        user_ids = [row[0] for row in source.execute("SELECT DISTINCT user_id FROM completions ORDER BY 1")]
+    finally:
+        source.close()
+
+    moved = {}
+    for path, shard_users in router.group(user_ids).items():
+        conn = router.connect(path)
+        conn.execute("ATTACH DATABASE ? AS source", (source_path,))
+        try:
+            with conn:
+                conn.execute(
+                    "INSERT OR IGNORE INTO timetable (day, time, activity, time_duration, start_min, end_min) "
+                    "SELECT day, time, activity, time_duration, start_min, end_min FROM source.timetable"
+                )
+                # The triggers build the shard's reward_totals as the rows go in
+                conn.execute(
+                    "INSERT OR IGNORE INTO completions "
+                    "(user_id, date, day, start_min, end_min, activity, completed_at) "
+                    "SELECT user_id, date, day, start_min, end_min, activity, completed_at "
+                    "FROM source.completions WHERE user_id IN ({})".format(", ".join("?" * len(shard_users))),
+                    shard_users,
+                )
+        finally:
+            conn.execute("DETACH DATABASE source")
+        moved[path] = len(shard_users)
+    return moved
+
+# Function run in a worker process: the rewards of one shard, grouped by user first
+def shard_rewards(path, reward_per_hour=10, group_by=("user",), start_date=None, end_date=None):
+    conn = Timetable._open_connection(path)
+    try:
+        with Timetable.use_connection(conn):
+            return timetable_rewards.calculate_rewards_sql(reward_per_hour, group_by, start_date, end_date)
+    finally:
+        conn.close()
+
+# Function to calculate the rewards of every user across all shards with a process pool
+# and merge them into one {user: reward} dict (tuple keys when grouping by more columns)
+def run_batch(router, reward_per_hour=10, group_by=("user",), start_date=None, end_date=None, workers=None):
+    if isinstance(group_by, str):
+        group_by = (group_by,)
+    if "user" not in group_by:
+        raise ValueError("group_by must include 'user' so shard results can be merged")
+
+    paths = router.paths()
+    totals = {}
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        # One shard per task keeps the slowest shard from holding back a whole chunk
+        results = pool.map(
+            shard_rewards, paths,
+            [reward_per_hour] * len(paths), [tuple(group_by)] * len(paths),
+            [start_date] * len(paths), [end_date] * len(paths),
+        )
+        for rewards in results:
+            for key, reward in rewards.items():
+                totals[key] = totals.get(key, 0) + reward
+    return totals
+
+
+if __name__ == "__main__":
+    arg_parser = argparse.ArgumentParser(description="Per-user shard databases for the timetable")
+    arg_parser.add_argument("--dir", default=SHARD_DIR, help="shard directory (default: %(default)s)")
+    arg_parser.add_argument("--buckets", type=int, help="hash users into this many shards instead of one per user")
+    subparsers = arg_parser.add_subparsers(dest="command", required=True)
+
+    split_parser = subparsers.add_parser("split", help="move the users of one database into shards")
+    split_parser.add_argument("--db", default=Timetable.DB_PATH)
+
+    rewards_parser = subparsers.add_parser("rewards", help="reward per user across all shards")
+    rewards_parser.add_argument("--from", dest="start", help="first date (YYYY-MM-DD)")
+    rewards_parser.add_argument("--to", dest="end", help="last date (YYYY-MM-DD)")
+    rewards_parser.add_argument("--reward-per-hour", type=float, default=10)
+    rewards_parser.add_argument("--workers", type=int, help="worker processes (default: one per CPU)")
+    args = arg_parser.parse_args()
+
+    router = ShardRouter(args.dir, args.buckets)
+    if args.command == "split":
+        moved = split_database(router, args.db)
+        print("{} users moved into {} shards".format(sum(moved.values()), len(moved)))
+    else:
+        rewards = run_batch(router, args.reward_per_hour, ("user",), args.start, args.end, args.workers)
+        for user_id, reward in sorted(rewards.items()):
+            print("{}: {} rupees".format(user_id, reward))
+    router.close()
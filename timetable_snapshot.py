@@ -0,0 +1,218 @@
+import mmap
+import os
+import struct
+from array import array
+from bisect import bisect_left, bisect_right
+from datetime import date, timedelta
+
+import Timetable
+
+# File layout: a header, then sections of native-endian arrays, each starting on 8 bytes
+#   strings:      uint32 offsets (count + 1) into a UTF-8 blob holding every distinct string
+#   slots:        int32 day, time, activity, status string ids and start/end minutes
+#   users:        int32 user id string ids (sorted) and the first completion of each (count + 1)
+#   completions:  int32 date ordinal, day id, activity id, start/end minutes, sorted by
+#                 user, date and start, plus int64 running totals of their minutes (count + 1)
+# Minutes are -1 where the database has NULL
+# The header is native-endian too, so its byte order marker (1) reads back as 1 only on a
+# machine with the writer's byte order
+SNAPSHOT_MAGIC = b"TTSNAP1\0"
+HEADER = struct.Struct("=8siIIIII")
+SLOT_COLUMNS = ("day", "time", "activity", "status", "start_min", "end_min")
+COMPLETION_COLUMNS = ("date", "day", "activity", "start_min", "end_min")
+
+# Function to compute where each array starts from the header counts
+def _layout(strings, blob_size, slots, users, completions):
+    sections = [("string_offsets", "I", strings + 1), ("blob", "B", blob_size)]
+    sections += [("slot_" + column, "i", slots) for column in SLOT_COLUMNS]
+    sections += [("user_ids", "i", users), ("user_offsets", "i", users + 1)]
+    sections += [("completion_" + column, "i", completions) for column in COMPLETION_COLUMNS]
+    sections.append(("completion_minutes", "q", completions + 1))
+
+    layout = {}
+    offset = HEADER.size
+    for name, typecode, count in sections:
+        offset = (offset + 7) // 8 * 8
+        layout[name] = (offset, typecode, count)
+        offset += array(typecode).itemsize * count
+    return layout, offset
+
+# Function to write the timetable and the completion log to a snapshot file
+# The file is written next to the target and renamed over it, so readers never see half a file
+def write_snapshot(path):
+    conn = Timetable.get_connection()
+    strings = {}
+
+    def string_id(value):
+        return strings.setdefault(value, len(strings))
+
+    slots = {column: array("i") for column in SLOT_COLUMNS}
+    for row in conn.execute("SELECT day, time, activity, time_duration, start_min, end_min FROM timetable"):
+        for column, value in zip(SLOT_COLUMNS[:4], row):
+            slots[column].append(string_id(value or ""))
+        slots["start_min"].append(-1 if row[4] is None else row[4])
+        slots["end_min"].append(-1 if row[5] is None else row[5])
+
+    user_ids = array("i")
+    user_offsets = array("i")
+    completions = {column: array("i") for column in COMPLETION_COLUMNS}
+    minutes = array("q", [0])
+    previous_user = None
+    for user_id, completed_date, day, activity, start_min, end_min in conn.execute(
+        "SELECT user_id, date, day, activity, start_min, end_min FROM completions "
+        "WHERE start_min IS NOT NULL ORDER BY user_id, date, start_min"
+    ):
+        if user_id != previous_user:
+            user_ids.append(string_id(user_id))
+            user_offsets.append(len(completions["date"]))
+            previous_user = user_id
+        completions["date"].append(date.fromisoformat(completed_date).toordinal())
+        completions["day"].append(string_id(day))
+        completions["activity"].append(string_id(activity))
+        completions["start_min"].append(start_min)
+        completions["end_min"].append(-1 if end_min is None else end_min)
+        # Open-ended slots count with zero minutes, as in calculate_reward_for_range
+        minutes.append(minutes[-1] + (0 if end_min is None else end_min - start_min))
+    user_offsets.append(len(completions["date"]))
+
+    blob = bytearray()
+    string_offsets = array("I", [0])
+    for value in strings:
+        blob += value.encode("utf-8")
+        string_offsets.append(len(blob))
+
+    layout, size = _layout(len(strings), len(blob), len(slots["day"]), len(user_ids), len(completions["date"]))
+    data = {"string_offsets": string_offsets, "blob": blob, "user_ids": user_ids,
+            "user_offsets": user_offsets, "completion_minutes": minutes}
+    data.update(("slot_" + column, values) for column, values in slots.items())
+    data.update(("completion_" + column, values) for column, values in completions.items())
+
+    temporary_path = path + ".tmp"
+    with open(temporary_path, "wb") as f:
+        f.write(HEADER.pack(SNAPSHOT_MAGIC, 1, len(strings), len(blob), len(slots["day"]),
+                            len(user_ids), len(completions["date"])))
+        for name, (offset, _, _) in layout.items():
+            f.write(b"\0" * (offset - f.tell()))
+            f.write(bytes(data[name]))
+        f.write(b"\0" * (size - f.tell()))
+    os.replace(temporary_path, path)
+    return {"slots": len(slots["day"]), "users": len(user_ids), "completions": len(completions["date"])}
+
+# Read-only view of a snapshot file, answering the read queries of the Timetable module
+# straight from the mapped arrays; strings are decoded only when a result needs them
+class Snapshot:
+    def __init__(self, path):
+        with open(path, "rb") as f:
+            self._mmap = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, byte_order, *counts = HEADER.unpack_from(self._mmap)
+        if magic != SNAPSHOT_MAGIC or byte_order != 1:
+            self._mmap.close()
+            if magic != SNAPSHOT_MAGIC:
+                raise ValueError("{} is not a timetable snapshot".format(path))
+            raise ValueError("{} was written on a machine with a different byte order".format(path))
+
+        view = memoryview(self._mmap)
+        self._views = [view]
+        self.arrays = {}
+        for name, (offset, typecode, count) in _layout(*counts)[0].items():
+            section = view[offset:offset + array(typecode).itemsize * count]
+            self._views.append(section)
+            if typecode != "B":
+                section = section.cast(typecode)
+                self._views.append(section)
+            self.arrays[name] = section
+        self._strings = {}
+        self._index = None
+        self.users = {self.string(string_id): i for i, string_id in enumerate(self.arrays["user_ids"])}
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def close(self):
+        for view in reversed(self._views):
+            view.release()
+        self.arrays = {}
+        self._mmap.close()
+
+    # Function to decode one string of the string table (cached once decoded)
+    def string(self, string_id):
+        value = self._strings.get(string_id)
+        if value is None:
+            offsets = self.arrays["string_offsets"]
+            value = self._strings[string_id] = str(self.arrays["blob"][offsets[string_id]:offsets[string_id + 1]], "utf-8")
+        return value
+
+    def __len__(self):
+        return len(self.arrays["slot_day"])
+
+    # Generator of the timetable slots as Slot records
+    def slots(self):
+        columns = [self.arrays["slot_" + column] for column in SLOT_COLUMNS]
+        for day, time, activity, status, start_min, end_min in zip(*columns):
+            yield Timetable.Slot(self.string(day), self.string(time), self.string(activity), self.string(status),
+                                 None if start_min < 0 else start_min, None if end_min < 0 else end_min)
+
+    # TimetableIndex over the snapshot's slots, built on first use
+    def timetable_index(self):
+        if self._index is None:
+            self._index = Timetable.TimetableIndex(self.slots())
+        return self._index
+
+    # Function to find the completion rows [low, high) of a user between two dates
+    def _user_range(self, user, start_date=None, end_date=None):
+        offsets = self.arrays["user_offsets"]
+        low, high = offsets[user], offsets[user + 1]
+        dates = self.arrays["completion_date"]
+        if start_date is not None:
+            low = bisect_left(dates, date.fromisoformat(str(start_date)).toordinal(), low, high)
+        if end_date is not None:
+            high = bisect_right(dates, date.fromisoformat(str(end_date)).toordinal(), low, high)
+        return low, high
+
+    def _users(self, user_id):
+        if user_id is None:
+            return range(len(self.users))
+        user = self.users.get(str(user_id))
+        return [] if user is None else [user]
+
+    # Same rows as Timetable.get_completions; completed_at is not kept in snapshots (None)
+    def get_completions(self, start_date=None, end_date=None, user_id=None, activity=None):
+        a = self.arrays
+        rows = []
+        for user in self._users(user_id):
+            name = self.string(a["user_ids"][user])
+            low, high = self._user_range(user, start_date, end_date)
+            for i in range(low, high):
+                row_activity = self.string(a["completion_activity"][i])
+                if activity is not None and row_activity != activity:
+                    continue
+                end_min = a["completion_end_min"][i]
+                rows.append((name, date.fromordinal(a["completion_date"][i]).isoformat(),
+                             self.string(a["completion_day"][i]), a["completion_start_min"][i],
+                             None if end_min < 0 else end_min, row_activity, None))
+        return rows
+
+    # Same result as Timetable.calculate_reward_for_range, from the running minute totals
+    def calculate_reward_for_range(self, start_date=None, end_date=None, user_id=None, reward_per_hour=10):
+        running = self.arrays["completion_minutes"]
+        minutes = 0
+        for user in self._users(user_id):
+            low, high = self._user_range(user, start_date, end_date)
+            minutes += running[high] - running[low]
+        return minutes / 60 * reward_per_hour
+
+    # Same result as Timetable.get_reward_to_transfer for "all", "day" and "week" periods
+    def get_reward_to_transfer(self, user_id=Timetable.DEFAULT_USER_ID, period="all", period_key="",
+                               reward_per_hour=10):
+        if period == "all":
+            return self.calculate_reward_for_range(None, None, user_id, reward_per_hour)
+        if period == "day":
+            return self.calculate_reward_for_range(period_key, period_key, user_id, reward_per_hour)
+        if period == "week":
+            year, week = str(period_key).split("-W")
+            monday = date.fromisocalendar(int(year), int(week), 1)
+            return self.calculate_reward_for_range(monday, monday + timedelta(days=6), user_id, reward_per_hour)
+        raise ValueError("period must be one of: all, day, week")
@@ -0,0 +1,180 @@
+from datetime import date, timedelta
+from functools import lru_cache
+
+import Timetable
+
+# Function to create the template tables: named day templates, the weekday -> template
+# mapping, rules bounding a weekly slot or thinning it out to every n-th week, and sparse
+# per-date overrides (an override with no activity removes the slot, one with no time
+# clears the whole date, e.g. for a holiday)
+# Weekdays without a template follow the weekly timetable table
+def create_template_tables():
+    with Timetable.transaction() as conn:
+        conn.execute('''
+            CREATE TABLE IF NOT EXISTS day_templates (
+                name TEXT,
+                time TEXT,
+                activity TEXT,
+                start_min INTEGER,
+                end_min INTEGER,
+                PRIMARY KEY (name, time)
+            )
+        ''')
+        conn.execute('''
+            CREATE TABLE IF NOT EXISTS weekday_templates (
+                weekday TEXT PRIMARY KEY,
+                template TEXT
+            )
+        ''')
+        conn.execute('''
+            CREATE TABLE IF NOT EXISTS slot_rules (
+                day TEXT,
+                time TEXT,
+                interval_weeks INTEGER DEFAULT 1,
+                start_date TEXT,
+                end_date TEXT,
+                PRIMARY KEY (day, time)
+            )
+        ''')
+        conn.execute('''
+            CREATE TABLE IF NOT EXISTS date_overrides (
+                date TEXT,
+                time TEXT,
+                activity TEXT,
+                start_min INTEGER,
+                end_min INTEGER,
+                PRIMARY KEY (date, time)
+            )
+        ''')
+
+# Function to store (or replace) a named day template from slot dicts with "Time" and "Activity"
+def save_template(name, slots):
+    rows = [(name, slot["Time"], slot["Activity"]) + Timetable.slot_minutes(slot) for slot in slots]
+    with Timetable.transaction() as conn:
+        conn.execute("DELETE FROM day_templates WHERE name=?", (name,))
+        conn.executemany("INSERT INTO day_templates VALUES (?, ?, ?, ?, ?)", rows)
+
+# Function to use a template for every date falling on the given weekday
+def assign_template(weekday, name):
+    if weekday not in Timetable.WEEKDAYS:
+        raise ValueError("unknown weekday {!r}".format(weekday))
+    with Timetable.transaction() as conn:
+        conn.execute("INSERT OR REPLACE INTO weekday_templates VALUES (?, ?)", (weekday, name))
+
+# Function to override one slot on one date; activity=None removes the slot for that date
+# and time=None clears every slot of the date (overrides with a time still apply on top)
+def set_override(override_date, time, activity=None):
+    start_min, end_min = (None, None) if time is None else Timetable.parse_time_range(time)
+    with Timetable.transaction() as conn:
+        # The key allows several NULL times, so a whole-date override replaces its predecessor by hand
+        conn.execute("DELETE FROM date_overrides WHERE date=? AND time IS ?", (_iso(override_date), time))
+        conn.execute(
+            "INSERT INTO date_overrides VALUES (?, ?, ?, ?, ?)",
+            (_iso(override_date), time, activity, start_min, end_min),
+        )
+
+# Function to drop an override so the date follows its template again
+def remove_override(override_date, time):
+    with Timetable.transaction() as conn:
+        conn.execute("DELETE FROM date_overrides WHERE date=? AND time IS ?", (_iso(override_date), time))
+
+def _iso(value):
+    return None if value is None else date.fromisoformat(str(value)).isoformat()
+
+# Function to group the days of a timetable (e.g. the example one) into distinct templates
+# Returns ({template name: slots}, {weekday: template name}); a template is named after
+# the first day that uses it
+def templates_from_timetable(timetable_data):
+    days = {}
+    for slot in timetable_data:
+        days.setdefault(slot["Day"], []).append({"Time": slot["Time"], "Activity": slot["Activity"]})
+
+    templates = {}
+    names = {}
+    weekday_templates = {}
+    for day, slots in days.items():
+        signature = tuple(sorted((slot["Time"], slot["Activity"]) for slot in slots))
+        if signature not in names:
+            names[signature] = day
+            templates[day] = slots
+        weekday_templates[day] = names[signature]
+    return templates, weekday_templates
+
+# Function to replace the stored templates with the deduplicated days of the timetable table
+def load_templates_from_timetable():
+    create_template_tables()
+    rows = Timetable.convert_to_dict(Timetable.get_connection().execute("SELECT * FROM timetable"))
+    templates, weekday_templates = templates_from_timetable(rows)
+    for name, slots in templates.items():
+        save_template(name, slots)
+    for weekday, name in weekday_templates.items():
+        if weekday in Timetable.WEEKDAYS:
+            assign_template(weekday, name)
+    return templates, weekday_templates
+
+# Function to expand one date into its slots (template or timetable slots allowed by their
+# rules, plus overrides), sorted by start time
+# The result is cached until this or another connection changes the database
+def resolve_date(resolved_date):
+    if isinstance(resolved_date, str):
+        resolved_date = date.fromisoformat(resolved_date)
+    return _resolve_date(resolved_date, Timetable.database_version())
+
+# Function to load the slots of a weekday with their rules as [(time, activity, start_min,
+# end_min, interval_weeks, start_date, end_date)]
+@lru_cache(maxsize=32)
+def _weekday_slots(weekday, version):
+    conn = Timetable.get_connection()
+    template = conn.execute("SELECT template FROM weekday_templates WHERE weekday=?", (weekday,)).fetchone()
+    if template is None:
+        query = "SELECT time, activity, start_min, end_min FROM timetable WHERE day=?"
+        params = (weekday,)
+    else:
+        query = "SELECT time, activity, start_min, end_min FROM day_templates WHERE name=?"
+        params = template
+    rules = {
+        time: rule for time, *rule in conn.execute(
+            "SELECT time, interval_weeks, start_date, end_date FROM slot_rules WHERE day=?", (weekday,)
+        )
+    }
+    return [row + tuple(rules.get(row[0], (1, None, None))) for row in conn.execute(query, params)]
+
+@lru_cache(maxsize=1024)
+def _resolve_date(resolved_date, version):
+    conn = Timetable.get_connection()
+    weekday = Timetable.WEEKDAYS[resolved_date.weekday()]
+    iso = resolved_date.isoformat()
+    slots = {}
+    for time, activity, start_min, end_min, interval_weeks, rule_start, rule_end in _weekday_slots(weekday, version):
+        if (rule_start and iso < rule_start) or (rule_end and iso > rule_end):
+            continue
+        if interval_weeks > 1 and (resolved_date - date.fromisoformat(rule_start)).days // 7 % interval_weeks:
+            continue
+        slots[time] = (time, activity, start_min, end_min)
+
+    # A whole-date override (no time) sorts first, so the date's other overrides survive it
+    for time, activity, start_min, end_min in conn.execute(
+        "SELECT time, activity, start_min, end_min FROM date_overrides WHERE date=? ORDER BY time IS NOT NULL", (iso,)
+    ):
+        if time is None:
+            slots.clear()
+        elif activity is None:
+            slots.pop(time, None)
+        else:
+            slots[time] = (time, activity, start_min, end_min)
+
+    return [
+        {"Day": weekday, "Date": iso, "Time": time, "Activity": activity,
+         "Time Duration": "", "Start Min": start_min, "End Min": end_min}
+        for time, activity, start_min, end_min in sorted(
+            slots.values(), key=lambda slot: (slot[2] is None, slot[2] or 0, slot[3] or 0)
+        )
+    ]
+
+# Generator of the resolved slots for every date from start_date to end_date (inclusive)
+def resolve_range(start_date, end_date):
+    current = date.fromisoformat(str(start_date))
+    end_date = date.fromisoformat(str(end_date))
+    while current <= end_date:
+        yield from resolve_date(current)
+        current += timedelta(days=1)
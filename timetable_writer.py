@@ -0,0 +1,97 @@
+import queue
+import threading
+from concurrent.futures import Future
+
+import Timetable
+
+# Most mutations committed together in one group transaction
+MAX_BATCH = 512
+
+# Queue of mutations drained by one writer thread, which owns the only writing connection and
+# commits everything waiting in one transaction; callers get a Future for each mutation
+# Every mutation runs in a savepoint, so a failing one is rolled back alone and the rest of
+# the group still commits; futures are resolved only after the commit
+class WriteQueue:
+    def __init__(self, max_batch=MAX_BATCH):
+        self.max_batch = max_batch
+        self.requests = queue.SimpleQueue()
+        self.thread = threading.Thread(target=self.run, name="timetable-group-writer", daemon=True)
+        self.closed = False
+        self.thread.start()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    # Function to queue func(*args, **kwargs) for the writer thread; returns its Future
+    def submit(self, func, *args, **kwargs):
+        if self.closed:
+            raise RuntimeError("the write queue is closed")
+        future = Future()
+        self.requests.put((func, args, kwargs, future))
+        return future
+
+    def mark_completion(self, day, time, user_id=Timetable.DEFAULT_USER_ID, completed_date=None):
+        return self.submit(Timetable.mark_gate_study_completion, day, time, user_id, completed_date)
+
+    def unmark_completion(self, day, time, user_id=Timetable.DEFAULT_USER_ID, completed_date=None):
+        return self.submit(Timetable.unmark_gate_study_completion, day, time, user_id, completed_date)
+
+    def insert_timetable_data(self, timetable):
+        return self.submit(Timetable.insert_timetable_data, list(timetable))
+
+    def bulk_insert(self, slots, on_conflict="ignore", validate=False):
+        return self.submit(Timetable.bulk_insert_timetable_data, list(slots), on_conflict, validate)
+
+    # Function to stop the writer once the queued mutations are committed
+    def close(self, wait=True):
+        if not self.closed:
+            self.closed = True
+            self.requests.put(None)
+        if wait:
+            self.thread.join()
+
+    def run(self):
+        running = True
+        while running:
+            batch = [self.requests.get()]
+            while len(batch) < self.max_batch:
+                try:
+                    batch.append(self.requests.get_nowait())
+                except queue.Empty:
+                    break
+            if any(request is None for request in batch):
+                running = False
+                batch = [request for request in batch if request is not None]
+            if batch:
+                self.commit(batch)
+
+    # Function to run one group of mutations in a single transaction and resolve their futures
+    def commit(self, batch):
+        outcomes = []
+        try:
+            with Timetable.transaction(immediate=True) as conn:
+                for func, args, kwargs, future in batch:
+                    if not future.set_running_or_notify_cancel():
+                        continue
+                    conn.execute("SAVEPOINT request")
+                    try:
+                        outcomes.append((future, func(*args, **kwargs), None))
+                    except Exception as error:
+                        conn.execute("ROLLBACK TO request")
+                        outcomes.append((future, None, error))
+                    conn.execute("RELEASE request")
+        except Exception as error:
+            # The commit itself failed, so none of the group's mutations happened
+            for func, args, kwargs, future in batch:
+                if future.running():
+                    future.set_exception(error)
+            return
+
+        for future, result, error in outcomes:
+            if error is not None:
+                future.set_exception(error)
+            else:
+                future.set_result(result)